@@ -1,5 +1,6 @@
 import osmnx as ox
 import matplotlib.pyplot as plt
+import engine
 
 # 1. CONFIGURACIÓN
 # Definimos exactamente qué queremos descargar.
@@ -9,10 +10,10 @@ print(f"--- INICIANDO SISTEMA ---")
 print(f"Descargando datos viales para: {LUGAR}")
 print("Esto puede tardar un poco dependiendo de tu internet...")
 
-# 2. DESCARGA DEL GRAFO
+# 2. DESCARGA DEL GRAFO (con caché de disco del engine)
 # network_type="walk" significa que solo bajamos calles donde se puede caminar.
-# simplify=True limpia el mapa para quitar nodos inútiles (curvas suaves).
-G = ox.graph_from_place(LUGAR, network_type="walk", simplify=True)
+# Si ya lo descargamos antes, engine.get_graph lo lee del .graphml local.
+G = engine.get_graph(LUGAR, network_type="walk")
 
 print("¡Datos descargados correctamente!")
 
@@ -25,7 +26,25 @@ print(f"- Número de intersecciones (Nodos): {num_nodos}")
 print(f"- Número de calles (Aristas): {num_calles}")
 
 # 4. VISUALIZACIÓN RÁPIDA (Plot estático)
+# datashader rasteriza los 159k+ segmentos con kernels vectorizados en vez
+# del LineCollection de matplotlib (overhead Python por arista). Si no está
+# instalado, caemos al plot clásico de OSMnx.
 print("Generando imagen del grafo (esqueleto)...")
-fig, ax = ox.plot_graph(G, node_size=0, edge_color="white", edge_linewidth=0.5, bgcolor="black")
+try:
+    import datashader as ds
+    import datashader.transfer_functions as tf
+    import pandas as pd
 
-print("Proceso terminado. Deberías ver una ventana con el mapa en negro.") 
\ No newline at end of file
+    nodos = G._node
+    segmentos = pd.DataFrame(
+        [(nodos[u]['x'], nodos[u]['y'], nodos[v]['x'], nodos[v]['y']) for u, v in G.edges()],
+        columns=['x0', 'y0', 'x1', 'y1']
+    )
+    cvs = ds.Canvas(plot_width=1920, plot_height=1080)
+    agg = cvs.line(segmentos, x=['x0', 'x1'], y=['y0', 'y1'], axis=1)
+    img = tf.set_background(tf.shade(agg, cmap=['white']), 'black')
+    img.to_pil().save("grafo.png")
+    print("Imagen rasterizada guardada en 'grafo.png'.")
+except ImportError:
+    fig, ax = ox.plot_graph(G, node_size=0, edge_color="white", edge_linewidth=0.5, bgcolor="black")
+    print("Proceso terminado. Deberías ver una ventana con el mapa en negro.")
\ No newline at end of file
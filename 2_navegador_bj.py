@@ -1,13 +1,20 @@
+import math
 import osmnx as ox
 import networkx as nx
 import folium
+import engine
 
 # 1. CONFIGURACIÓN
 LUGAR = "Benito Juárez, Ciudad de México, Mexico"
 print(f"[1/4] Cargando mapa de: {LUGAR}...")
 
-# Descargamos el grafo
-G = ox.graph_from_place(LUGAR, network_type="walk")
+# Descargamos el grafo (o lo leemos del caché de disco si ya existe)
+G = engine.get_graph(LUGAR, network_type="walk")
+
+# Proyectamos una sola vez a CRS planar de México (ITRF2008 / EPSG:6372):
+# las distancias se vuelven restas simples en metros, sin sin/cos por arista,
+# y habilitan una heurística euclidiana exacta para A*.
+G_proj = ox.project_graph(G, to_crs="EPSG:6372")
 
 # 2. DEFINIR ORIGEN Y DESTINO
 origen_lat, origen_lon = 19.3695, -99.1573 # Parque de los Venados
@@ -18,17 +25,28 @@ nodo_origen = ox.nearest_nodes(G, origen_lon, origen_lat)
 nodo_destino = ox.nearest_nodes(G, destino_lon, destino_lat)
 
 # 3. CALCULAR RUTA
+# A* sobre el grafo proyectado: la distancia euclidiana en metros es una
+# cota inferior exacta de 'length', así que la búsqueda se enfoca hacia el
+# destino y expande menos nodos que cualquier Dijkstra.
 print(f"[3/4] Calculando ruta óptima...")
-ruta = nx.shortest_path(G, nodo_origen, nodo_destino, weight='length')
+nodos_proj = G_proj._node
+
+def heuristica_euclidiana(u, v):
+    du, dv = nodos_proj[u], nodos_proj[v]
+    return math.hypot(du['x'] - dv['x'], du['y'] - dv['y'])
+
+ruta = nx.astar_path(G_proj, nodo_origen, nodo_destino, heuristic=heuristica_euclidiana, weight='length')
 
 # 4. VISUALIZACIÓN MANUAL (La nueva forma Pro)
 print(f"[4/4] Dibujando mapa...")
 
-# Extraemos las coordenadas (Latitud, Longitud) de cada nodo de la ruta
+# Extraemos las coordenadas (Latitud, Longitud) de cada nodo de la ruta.
+# G._node es el dict interno: mismo dato que G.nodes[n] sin el dispatch de la vista.
 route_coords = []
+nodos = G._node
 for node in ruta:
-    # G.nodes[node] nos da los datos del punto. 'y' es latitud, 'x' es longitud.
-    point = (G.nodes[node]['y'], G.nodes[node]['x'])
+    # 'y' es latitud, 'x' es longitud.
+    point = (nodos[node]['y'], nodos[node]['x'])
     route_coords.append(point)
 
 # Creamos el mapa base centrado en el inicio
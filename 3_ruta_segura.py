@@ -1,38 +1,34 @@
 import osmnx as ox
 import networkx as nx
 import folium
+import numpy as np
+import engine
 
 # 1. CARGAR EL MAPA
 LUGAR = "Benito Juárez, Ciudad de México, Mexico"
 print(f"[1/5] Cargando el grafo de: {LUGAR}...")
-G = ox.graph_from_place(LUGAR, network_type="walk")
+G = engine.get_graph(LUGAR, network_type="walk")
 
 # 2. HACKEANDO EL GRAFO (LA CLASE DE HOY) 🎓
-print(f"[2/5] Aplicando penalizaciones a avenidas peligrosas...")
-
-# Iteramos sobre todas las calles (aristas) del mapa
-# u = nodo inicio, v = nodo fin, data = información de la calle
-for u, v, data in G.edges(data=True):
-    
-    # Obtenemos el tipo de calle (highway)
-    tipo_calle = data.get('highway', 'unknown')
-    longitud = data.get('length', 0)
-    
-    # A veces 'tipo_calle' es una lista (ej. ['tertiary', 'residential'])
-    # Lo convertimos a string para facilitar la comparación
-    if isinstance(tipo_calle, list):
-        tipo_calle = tipo_calle[0]
-    
-    # --- LÓGICA DE PASTOREO ---
-    # Si es una avenida grande (primary) o tronco (trunk), es peligrosa/ruidosa
-    if tipo_calle in ['primary', 'trunk', 'primary_link', 'secondary']:
-        penalizacion = 10  # ¡Cuesta 10 veces más pasar por aquí!
-    else:
-        penalizacion = 1   # Calle normal, costo estándar
-        
-    # Creamos el nuevo atributo 'costo_pastoreo'
-    # Costo = Metros Reales * Penalización
-    data['costo_pastoreo'] = longitud * penalizacion
+print(f"[2/5] Aplicando penalizaciones a avenidas peligrosas (vectorizado)...")
+
+# En lugar de iterar 159k aristas en Python puro, volcamos las calles a un
+# GeoDataFrame y calculamos la penalización con NumPy: un puñado de loops en C.
+AVENIDAS_PELIGROSAS = {'primary', 'trunk', 'primary_link', 'secondary'}
+
+edges_gdf = ox.graph_to_gdfs(G, nodes=False)
+
+# A veces 'highway' es una lista (ej. ['tertiary', 'residential']);
+# normalizamos una sola vez al primer valor.
+tipo_calle = edges_gdf['highway'].apply(lambda x: x[0] if isinstance(x, list) else x)
+
+# --- LÓGICA DE PASTOREO (vectorizada) ---
+# Si es una avenida grande (primary) o tronco (trunk), cuesta 10 veces más.
+penalizacion = np.where(tipo_calle.isin(AVENIDAS_PELIGROSAS), 10.0, 1.0)
+
+# Costo = Metros Reales * Penalización, escrito de vuelta al grafo en bloque
+costo = edges_gdf['length'].to_numpy() * penalizacion
+nx.set_edge_attributes(G, dict(zip(edges_gdf.index, costo)), 'costo_pastoreo')
 
 # 3. DEFINIR PUNTOS (Mismos de antes)
 origen_lat, origen_lon = 19.3695, -99.1573 # Parque Venados
@@ -42,29 +38,35 @@ nodo_origen = ox.nearest_nodes(G, origen_lon, origen_lat)
 nodo_destino = ox.nearest_nodes(G, destino_lon, destino_lat)
 
 # 4. CALCULAR LAS DOS RUTAS
-print(f"[3/5] Calculando Ruta RÁPIDA (Dijkstra normal)...")
-ruta_rapida = nx.shortest_path(G, nodo_origen, nodo_destino, weight='length')
+# Usamos bidirectional_dijkstra: para un solo par origen-destino expande
+# muchísimos menos nodos que el Dijkstra de fuente única.
+print(f"[3/5] Calculando Ruta RÁPIDA (Dijkstra bidireccional)...")
+_, ruta_rapida = nx.bidirectional_dijkstra(G, nodo_origen, nodo_destino, weight='length')
 
 print(f"[4/5] Calculando Ruta TRANQUILA (Dijkstra modificado)...")
 # Nota que aquí usamos weight='costo_pastoreo' en lugar de 'length'
-ruta_tranquila = nx.shortest_path(G, nodo_origen, nodo_destino, weight='costo_pastoreo')
+_, ruta_tranquila = nx.bidirectional_dijkstra(G, nodo_origen, nodo_destino, weight='costo_pastoreo')
 
 # 5. VISUALIZACIÓN COMPARATIVA
 print(f"[5/5] Generando mapa comparativo...")
 
-# Función auxiliar para dibujar rutas (para no repetir código)
-def dibujar_ruta(mapa, grafo, ruta, color, grosor):
-    coords = [(grafo.nodes[n]['y'], grafo.nodes[n]['x']) for n in ruta]
+# Función auxiliar para dibujar rutas (para no repetir código).
+# Usamos la vista SoA del engine: las coordenadas salen con un gather de
+# NumPy sobre arreglos contiguos en vez de un dict lookup por nodo.
+soa = engine.obtener_soa(G)
+
+def dibujar_ruta(mapa, soa_grafo, ruta, color, grosor):
+    coords = soa_grafo.coords_de_ruta(ruta).tolist()
     folium.PolyLine(coords, color=color, weight=grosor, opacity=0.8).add_to(mapa)
 
 # Mapa base
 m = folium.Map(location=[origen_lat, origen_lon], zoom_start=14)
 
 # Dibujamos Ruta Rápida (ROJO)
-dibujar_ruta(m, G, ruta_rapida, color="red", grosor=4)
+dibujar_ruta(m, soa, ruta_rapida, color="red", grosor=4)
 
 # Dibujamos Ruta Tranquila (VERDE)
-dibujar_ruta(m, G, ruta_tranquila, color="green", grosor=4)
+dibujar_ruta(m, soa, ruta_tranquila, color="green", grosor=4)
 
 # Marcadores
 folium.Marker([origen_lat, origen_lon], popup="Inicio", icon=folium.Icon(color="black")).add_to(m)
@@ -1,9 +1,33 @@
+import argparse
 import osmnx as ox
 import networkx as nx
+import numpy as np
 import json
 import os
+import engine
 from shapely.geometry import Point
 from scipy.spatial import KDTree
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# --- UrbanOS 2040: Kernel JIT de la Fórmula (Misión 2 Turbo) ---
+if njit:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _kernel_sandoval(lengths, safe_mask, vol):
+        """Kernel compilado a código máquina: costo = length * bono * volatilidad."""
+        out = np.empty_like(lengths)
+        for i in prange(lengths.size):
+            base = lengths[i]
+            if safe_mask[i]:
+                base *= 0.5  # Corredor Verde
+            out[i] = base * vol[i]
+        return out
+else:
+    def _kernel_sandoval(lengths, safe_mask, vol):
+        """Fallback NumPy cuando Numba no está instalado."""
+        return lengths * np.where(safe_mask, 0.5, 1.0) * vol
 
 # --- UrbanOS 2040: Dynamic Stress Calibration ---
 REALTIME_FILE = "realtime_fallback.json"
@@ -45,9 +69,20 @@ def calcular_peso_sandoval_v2(data, nivel_volatilidad=1.0, incidentes_coords=Non
     return costo_base * nivel_volatilidad
 
 # --- Misión 2: Script de Prueba Dinámico ---
+# El caché Overpass de OSMnx y el .graphml local vienen activados desde
+# engine; --refresh los ignora cuando se necesita un grafo realmente fresco.
+parser = argparse.ArgumentParser(description="Fórmula Maestra Sandoval (Misión 2)")
+parser.add_argument("--refresh", action="store_true", help="Re-descargar el grafo de OSM ignorando cachés")
+args = parser.parse_args()
+
 print(f"[1/4] Cargando Grafo y Datos de Volatilidad...")
 LUGAR = "Colonia Roma Norte, Ciudad de México, Mexico"
-G = ox.graph_from_place(LUGAR, network_type="walk")
+if args.refresh:
+    ox.settings.use_cache = False
+    cache_path = engine._graph_cache_path(LUGAR)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+G = engine.get_graph(LUGAR, network_type="walk")
 incidentes = cargar_datos_volatilidad()
 
 # Preparar KDTree para búsqueda de 500m (Rápido)
@@ -57,31 +92,45 @@ if incidentes:
 else:
     tree = None
 
-print(f"[2/4] Aplicando Fórmula Sandoval™ Dinámica (Misión 2)...")
-for u, v, k, data in G.edges(keys=True, data=True):
-    # Obtener lat/lon del punto medio para el radio
-    mid_x = (G.nodes[u]['x'] + G.nodes[v]['x']) / 2
-    mid_y = (G.nodes[u]['y'] + G.nodes[v]['y']) / 2
-    
-    # Nivel de Volatilidad por cercanía a incidentes (500m ~ 0.0045 grados)
-    penalty = 1.0
-    if tree:
-        indices = tree.query_ball_point([mid_x, mid_y], 0.0045)
-        if indices:
-            penalty = 5.0 # Aumenta 500% el estrés
-            
-    data['costo_sandoval'] = calcular_peso_sandoval_v2(data, nivel_volatilidad=penalty)
+print(f"[2/4] Aplicando Fórmula Sandoval™ Dinámica (Misión 2, vectorizada)...")
+# Vectorización CTO: en lugar de 159k viajes por el intérprete, volcamos las
+# aristas a un GeoDataFrame y calculamos el costo base con NumPy en bloque.
+nodes_gdf, edges_gdf = ox.graph_to_gdfs(G)
+nombres = edges_gdf['name'].apply(lambda x: x[0] if isinstance(x, list) else x)
+nombres = nombres.fillna('Unknown').astype(str).str.lower()
+
+# Lista Blanca (Bonos de Seguridad): Corredores Verdes al 0.5x
+NOMBRES_SEGUROS = ["colima", "tabasco", "guadalajara", "orizaba"]
+safe_mask = nombres.str.contains('|'.join(NOMBRES_SEGUROS), na=False).to_numpy()
+lengths = edges_gdf['length'].to_numpy(dtype=np.float64)
+
+# Nivel de Volatilidad por cercanía a incidentes (500m ~ 0.0045 grados).
+# Una sola consulta batched al KDTree en vez de una llamada Python por arista:
+# la travesía vectorizada en C devuelve el conteo de incidentes por punto medio.
+penalty = np.ones(len(edges_gdf))
+if tree:
+    us = edges_gdf.index.get_level_values(0)
+    vs = edges_gdf.index.get_level_values(1)
+    mid_x = (nodes_gdf['x'].loc[us].to_numpy() + nodes_gdf['x'].loc[vs].to_numpy()) / 2
+    mid_y = (nodes_gdf['y'].loc[us].to_numpy() + nodes_gdf['y'].loc[vs].to_numpy()) / 2
+    counts = tree.query_ball_point(np.column_stack([mid_x, mid_y]), 0.0045, return_length=True)
+    penalty = np.where(counts > 0, 5.0, 1.0)  # Aumenta 500% el estrés
+
+costo = _kernel_sandoval(lengths, safe_mask, penalty)
+nx.set_edge_attributes(G, dict(zip(edges_gdf.index, costo)), 'costo_sandoval')
 
 # 4. Verificación de "Zona de Sombra"
 origen = (19.4188, -99.1609)
 destino = (19.4208, -99.1566)
-n_o = ox.nearest_nodes(G, origen[1], origen[1])
-n_d = ox.nearest_nodes(G, destino[1], destino[0])
+# X=longitud, Y=latitud (antes se pasaba la longitud dos veces en el origen)
+n_o = ox.nearest_nodes(G, X=origen[1], Y=origen[0])
+n_d = ox.nearest_nodes(G, X=destino[1], Y=destino[0])
 
 try:
-    ruta = nx.shortest_path(G, n_o, n_d, weight='costo_sandoval')
+    # Bidireccional: media frontera de búsqueda para la consulta punto a punto
+    _, ruta = nx.bidirectional_dijkstra(G, n_o, n_d, weight='costo_sandoval')
     print(f"[3/4] Ruta calculada con éxito eludiendo zonas de sombra.")
-except:
-    print(f"[ERROR] No se pudo calcular la ruta.")
+except nx.NetworkXNoPath as e:
+    print(f"[ERROR] Sin conectividad entre los puntos: {e}")
 
 print(f"[4/4] Hecho. Fórmula Sandoval™ actualizada para Misión Crítica.")
\ No newline at end of file
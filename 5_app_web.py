@@ -1,16 +1,24 @@
 import streamlit as st
-import osmnx as ox
-import networkx as nx
-import folium
-from streamlit_folium import st_folium
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import numpy as np
 import base64
+import mmap
 import os
+try:
+    import pybase64  # encoder SIMD (AVX2/NEON): ~4-10x sobre base64 stdlib
+except ImportError:
+    pybase64 = None
 import engine
 # Logger is handled via logging module if needed
-import random
 import time
 import plotly.graph_objects as go
 
+# folium / streamlit_folium se importan de forma diferida dentro del bloque
+# de mapa: los reruns que cortan antes (placeholder "parámetros requeridos")
+# no pagan esos imports. osmnx/networkx ya no se usan directamente aquí —
+# llegan vía engine, que sí los necesita siempre.
+
 
 # --- 1. CONFIGURACIÓN DE PÁGINA ---
 def cargar_configuracion():
@@ -33,19 +41,47 @@ cargar_configuracion()
 def get_base64_image_cached(image_path):
     """Codifica una imagen en Base64 con almacenamiento en caché.
 
+    Además del caché de Streamlit (por proceso), persiste el resultado en un
+    sidecar `<imagen>.b64`: los arranques fríos leen el string ya codificado
+    en vez de re-encodear el JPEG.
+
     Args:
         image_path (str): Ruta local al archivo de imagen.
 
     Returns:
         Optional[str]: String codificado en Base64 o None si el archivo no existe.
     """
-    if os.path.exists(image_path):
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    return None
+    if not os.path.exists(image_path):
+        return None
+
+    sidecar = image_path + ".b64"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(image_path):
+        with open(sidecar, "r") as f:
+            return f.read()
+
+    # mmap evita copiar los bytes del archivo antes de codificar; pybase64
+    # encodea con kernels SIMD cuando está instalado.
+    with open(image_path, "rb") as img_file:
+        mm = mmap.mmap(img_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if pybase64 is not None:
+                encoded = pybase64.b64encode(mm).decode('ascii')
+            else:
+                encoded = base64.b64encode(mm).decode('ascii')
+        finally:
+            mm.close()
+    try:
+        with open(sidecar, "w") as f:
+            f.write(encoded)
+    except OSError:
+        pass  # sistema de archivos de solo lectura: seguimos con el caché en memoria
+    return encoded
 
 # --- 3. CSS (SENIOR FULLSTACK REFACTOR - MacBook Air M4 Optimized) ---
-st.markdown("""
+# Bloques estáticos hoisteados a constantes de módulo: un solo string
+# internado que Streamlit dedupe por hash de contenido, sin re-evaluar
+# el literal en cada rerun.
+_CSS = """
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
     
@@ -200,19 +236,99 @@ st.markdown("""
         font-style: italic;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+_SIDEBAR_HEADER_HTML = '''
+    <div class="header-container">
+        <h1 class="brand-title"><b>U</b>RBANgraph</h1>
+        <div class="brand-subtitle">Plataforma de Análisis Topológico | Ingeniería Mexicana</div>
+    </div>
+
+    <div style="font-size: 0.65rem; color: #94A3B8; margin-top: -5px; line-height: 1.3; margin-bottom: 20px; font-weight: 500;">
+        Motor de Inteligencia Espacial optimizado para la gestión de riesgos y movilidad urbana.
+    </div>
+    '''
+
+_LEGEND_HTML = '''
+    <div class="legend-sidebar" style="margin-top: 0px; border-top: none;">
+        <div class="legend-item"><i class="fa fa-exclamation-triangle legend-icon" style="color:#EF4444"></i> Riesgo C5 (Fatal)</div>
+        <div class="legend-item"><div class="legend-icon" style="color:#10B981">●</div> Ruta Escudo (Segura)</div>
+        <div class="legend-item"><div class="legend-icon" style="color:#EF4444">●</div> Ruta Relámpago (Veloz)</div>
+        <div class="legend-item"><div class="legend-icon" style="color:orange">●</div> Estación Metro</div>
+        <div class="legend-item"><i class="fa fa-bicycle legend-icon" style="color:#F59E0B"></i> Red Ecobici</div>
+    </div>
+    '''
+
+_QUOTE_HTML = '''
+        <div class="quote-box">
+            Soli Deo Gloria. Ingeniería al servicio del prójimo. Que el sistema sea limpio y funcional.
+        </div>
+    '''
+
+_FOOTER_FIXED_HTML = '''
+    <div class="status-footer-fixed">
+        <div><span class="status-dot"></span> API ONLINE 2.6.0</div>
+        <div>UrbanGraph Tactical</div>
+    </div>
+    '''
+
+_FOOTER_HTML = '''
+    <div class="status-footer">
+        <div><span class="status-dot"></span> API ONLINE 2.6.0</div>
+        <div>UrbanGraph Tactical</div>
+    </div>
+    '''
+
+# Plantilla precompilada de la barra de métricas: str.format sobre una
+# constante en lugar de re-parsear un f-string multilínea por rerun.
+_METRICS_TMPL = '''
+    <div class="metrics-bar">
+        <div class="metric-card">
+            <div class="metric-label">Tiempo Relajado</div>
+            <div class="metric-value blue">{t_relajado} min</div>
+        </div>
+        <div class="metric-card">
+            <div class="metric-label">Minutos Ganados</div>
+            <div class="metric-value green">+{m_ganados}</div>
+        </div>
+        <div class="metric-card">
+            <div class="metric-label">Distancia Total</div>
+            <div class="metric-value">{distancia}m</div>
+        </div>
+    </div>
+    '''
+
+st.markdown(_CSS, unsafe_allow_html=True)
 
 # --- 4. CORE ENGINE INTEGRATION ---
 
-@st.cache_data(show_spinner=False)
+@st.cache_resource(show_spinner=False)
 def obtener_grafo_optimizado():
     """Recupera el grafo base del motor UrbanOS.
 
+    cache_resource mantiene UNA referencia viva en memoria: cache_data
+    picklea/des-picklea el MultiDiGraph completo en cada hit, un round-trip
+    de cientos de MB por rerun. El análisis multi-ruta ya no muta el grafo,
+    así que compartir la instancia es seguro.
+
     Returns:
         nx.MultiDiGraph: El grafo urbano cargado y listo para análisis.
     """
     return engine.cargar_grafo_seguro()
 
+@st.cache_resource(ttl=3600, show_spinner=False)
+def obtener_transporte():
+    """Estaciones de transporte categorizadas (una extracción por hora).
+
+    Antes se recorría el grafo completo en cada rerun; la lista es
+    estática a escala de sesión, así que cache_resource comparte la
+    misma referencia sin round-trip de pickle.
+
+    Returns:
+        List[Dict]: Estaciones con lat/lon/color por categoría.
+    """
+    return engine.extraer_estaciones_transporte()
+
 @st.cache_data(ttl=300, show_spinner=False)
 def get_realtime_sync():
     """Sincroniza datos en tiempo real (Pilar 1: Orquestación).
@@ -222,35 +338,73 @@ def get_realtime_sync():
     """
     return engine.fetch_realtime_data()
 
+@dataclass(slots=True)
+class RouteAnalysis:
+    """Resultado del análisis táctico en campos tipados.
+
+    Slots en lugar de un dict route-keyed: las métricas se leen muchas
+    veces por rerun y el acceso por atributo evita el hash de strings
+    tipo f"{key}_dist" en cada lectura. Picklea compacto para cache_data.
+    """
+    directa: list = None
+    escudo: list = None
+    relampago: list = None
+    directa_dist: float = 0.0
+    directa_time: float = 0.0
+    escudo_dist: float = 0.0
+    escudo_time: float = 0.0
+    relampago_dist: float = 0.0
+    relampago_time: float = 0.0
+    directa_coords: list = None
+    escudo_coords: list = None
+    relampago_coords: list = None
+    integridad: dict = None
+
 @st.cache_data(show_spinner=False)
-def obtener_analisis_tactico(hurry_factor, c_orig, c_dest, incidentes, realtime_data):
+def obtener_analisis_tactico(hurry_factor, c_orig, c_dest, _incidentes, _realtime_data, incidentes_epoch=0, realtime_epoch=""):
+    """Análisis multi-ruta cacheado por identidad barata.
+
+    Los argumentos con guión bajo no entran a la clave del caché: hashear
+    la lista completa de incidentes y el dict de telemetría en cada rerun
+    costaba O(N). Los epochs (marca de generación de incidentes y
+    last_sync del heartbeat) los representan como dos escalares.
+    """
     G = obtener_grafo_optimizado()
-    analisis = engine.obtener_analisis_multi_ruta(G, c_orig, c_dest, hurry_factor, incidentes=incidentes, realtime_data=realtime_data)
-    
+    datos = engine.obtener_analisis_multi_ruta(G, c_orig, c_dest, hurry_factor, incidentes=_incidentes, realtime_data=_realtime_data)
+    analisis = RouteAnalysis(
+        directa=datos.get("directa"),
+        escudo=datos.get("escudo"),
+        relampago=datos.get("relampago"),
+    )
+
+    # Distancias fusionadas: el motor ya las sumó sobre el SoA en la misma
+    # llamada que encontró las rutas, aquí solo se leen del resultado.
+    # Las coords se materializan UNA vez (orden lon/lat, listo para GeoJSON):
+    # los reruns ya no pagan el dict lookup por nodo al redibujar el mapa.
+    # Chequeo explícito en lugar de try/except: el caso "sin ruta" es el
+    # común y ya no paga la construcción de un traceback; los campos del
+    # dataclass quedan en sus ceros por defecto.
+    soa = engine.obtener_soa(G)
     for key in ["directa", "relampago", "escudo"]:
-        if analisis.get(key):
-            try:
-                # CORRECCIÓN: Usar ox.routing en lugar de ox.utils_graph
-                lengths = ox.routing.route_to_gdf(G, analisis[key])["length"]
-                distancia_total = sum(lengths)
-                analisis[f"{key}_dist"] = distancia_total
-                
-                # Fallback Táctico: 1.2 m/s (Paso peatonal)
-                analisis[f"{key}_time"] = (distancia_total / 1.2) / 60 
-            except Exception as e:
-                analisis[f"{key}_dist"] = 0
-                analisis[f"{key}_time"] = 0
-    
+        ruta = getattr(analisis, key)
+        if ruta and len(ruta) > 1:
+            distancia_total = datos.get(f"{key}_dist", 0.0)
+            setattr(analisis, f"{key}_dist", distancia_total)
+
+            # Fallback Táctico: 1.2 m/s (Paso peatonal)
+            setattr(analisis, f"{key}_time", (distancia_total / 1.2) / 60)
+            setattr(analisis, f"{key}_coords", soa.coords_de_ruta(ruta)[:, ::-1].tolist())
+
     # Misión 9: Integridad y Estrés Urbano
     try:
-        if analisis.get("relampago"):
-            # Convertimos IDs de nodos a coordenadas para la evaluación de integridad
-            ruta_coords = [(G.nodes[n]['y'], G.nodes[n]['x']) for n in analisis["relampago"]]
-            integridad = engine.evaluar_integridad_ruta(ruta_coords, G=G)
-            analisis["integridad"] = integridad
+        if analisis.relampago:
+            # Coordenadas desde el SoA (un gather de NumPy) en vez de 2N
+            # saltos de dict por el NodeView de NetworkX
+            ruta_coords = [tuple(c) for c in soa.coords_de_ruta(analisis.relampago).tolist()]
+            analisis.integridad = engine.evaluar_integridad_ruta(ruta_coords, G=G)
     except Exception as e:
         st.error(f"Error en evaluación de integridad: {e}")
-                
+
     return analisis
 
 def render_gauge_chart(score, level):
@@ -294,10 +448,99 @@ def render_b2g_analysis(incidentes):
         return
     
     st.write(f"Zonas de Intervención: **{len(incidentes)}**")
-    for inc in incidentes:
+    # Keys deterministas: con key=random.random() cada rerun creaba widgets
+    # "nuevos" para Streamlit, invalidando su caché de estado y forzando un
+    # re-diff completo del árbol (además de romper el manejo del click).
+    for i, inc in enumerate(incidentes):
         with st.expander(f"Incidente: {inc['tipo']}"):
             st.write(f"Prioridad: **ALTA** (Impacto {inc['impacto']}x)")
-            st.button(f"Sugerir intervención en coord {list(inc.values())[1:3]}", key=random.random())
+            st.button(f"Sugerir intervención en coord {(inc['lat'], inc['lon'])}", key=f"sugerir_{i}_{inc['tipo']}")
+
+def construir_mapa_tactico(analisis, incidentes, transporte, c_orig, c_dest):
+    """Construye el mapa folium completo (rutas, incidentes, transporte).
+
+    Se invoca solo cuando cambia la firma del mapa (ver bloque de render):
+    así los reruns de Streamlit por pan/zoom/slider reutilizan el objeto ya
+    construido en lugar de re-agregar cada marcador y reserializar todo.
+
+    Args:
+        analisis (RouteAnalysis): Análisis táctico con las coords de ruta materializadas.
+        incidentes (List[Dict]): Incidentes sintéticos + tiempo real.
+        transporte (List[Dict]): Estaciones de transporte categorizadas.
+        c_orig (Tuple): Coordenadas (lat, lon) de origen.
+        c_dest (Tuple): Coordenadas (lat, lon) de destino.
+
+    Returns:
+        folium.Map: El mapa listo para st_folium.
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    # Centro y zoom resueltos en Python en vez de m.fit_bounds: Leaflet ya
+    # no recomputa el encuadre en cada re-render del iframe, así el pan/zoom
+    # del usuario sobrevive a los reruns por interacción.
+    pts = np.array([c_orig, c_dest], dtype=np.float64)
+    centro = pts.mean(axis=0).tolist()
+    span = float(np.abs(pts[0] - pts[1]).max())
+    zoom = 15 if span < 0.02 else 14 if span < 0.05 else 13
+
+    m = folium.Map(location=centro, tiles='CartoDB Positron', attr='UrbanGraph', zoom_start=zoom)
+
+    # Draw Paths: una sola FeatureCollection GeoJSON en vez de tres
+    # PolyLine — Folium la pasa como un string al browser (HTML más chico) y
+    # las coordenadas ya vienen materializadas del análisis cacheado.
+    ESTILOS_RUTA = [
+        ("directa", "#475569", 3, 0.2),
+        ("escudo", "#10B981", 5, 0.5),
+        ("relampago", "#EF4444", 6, 0.8),
+    ]
+    features = []
+    for clave, color, grosor, opacidad in ESTILOS_RUTA:
+        coords = getattr(analisis, f"{clave}_coords")
+        if not coords:
+            continue
+        features.append({
+            "type": "Feature",
+            "properties": {"color": color, "weight": grosor, "opacity": opacidad},
+            # Las coords ya están en orden GeoJSON (lon, lat)
+            "geometry": {"type": "LineString", "coordinates": coords},
+        })
+    if features:
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            style_function=lambda f: {
+                "color": f["properties"]["color"],
+                "weight": f["properties"]["weight"],
+                "opacity": f["properties"]["opacity"],
+            },
+        ).add_to(m)
+
+    # Markers (FontAwesome Professionals): un solo FeatureGroup para todos
+    # los incidentes en vez de add_to(m) por marcador.
+    grupo_incidentes = folium.FeatureGroup(name="Incidentes C5/ADIP")
+    for inc in incidentes:
+        folium.Marker([inc["lat"], inc["lon"]],
+                      icon=folium.Icon(color=inc["color"], icon='exclamation-triangle', prefix='fa'),
+                      tooltip=inc['tipo']).add_to(grupo_incidentes)
+    grupo_incidentes.add_to(m)
+
+    # Transporte: FastMarkerCluster serializa el arreglo una sola vez y el
+    # circleMarker se construye del lado del cliente en JS, no en Python.
+    if transporte:
+        FastMarkerCluster(
+            [[s['lat'], s['lon'], s['color']] for s in transporte],
+            callback=(
+                "function (row) {"
+                " return L.circleMarker([row[0], row[1]],"
+                " {radius: 2, color: row[2], fill: true});"
+                "}"
+            ),
+        ).add_to(m)
+
+    folium.Marker(c_orig, icon=folium.Icon(color='green', icon='play', prefix='fa'), tooltip="Origen").add_to(m)
+    folium.Marker(c_dest, icon=folium.Icon(color='red', icon='flag-checkered', prefix='fa'), tooltip="Destino").add_to(m)
+
+    return m
 
 COORDENADAS_FIJAS = {
     "Metro Zapata": {"coords": (19.3703, -99.1751), "tipo": "metro"},
@@ -307,6 +550,17 @@ COORDENADAS_FIJAS = {
     "Ecobici Mixcoac": {"coords": (19.3745, -99.1821), "tipo": "bicicleta"}
 }
 
+# Materializados una vez a nivel de módulo: el selectbox recibe siempre la
+# misma tupla (sin re-listar el dict en cada rerun) y la matriz contigua
+# permite resolver el landmark más cercano con un solo argmin vectorizado.
+FIXED_NAMES = (*COORDENADAS_FIJAS.keys(), "-- Manual --")
+FIXED_COORDS = np.array([v["coords"] for v in COORDENADAS_FIJAS.values()], dtype=np.float32)
+
+def landmark_mas_cercano(latlon):
+    """Devuelve las coords del punto fijo más cercano a (lat, lon)."""
+    idx = int(np.linalg.norm(FIXED_COORDS - np.asarray(latlon, dtype=np.float32), axis=1).argmin())
+    return tuple(FIXED_COORDS[idx].tolist())
+
 # --- 5. INITIALIZATION ---
 
 if "rutas_calculadas" not in st.session_state:
@@ -316,17 +570,25 @@ if "incidentes" not in st.session_state:
     st.session_state["incidentes"] = []
 
 # --- 6. DATA INGESTION (HEARTBEAT) ---
-realtime_data = get_realtime_sync()
-transporte = engine.extraer_estaciones_transporte()
-analisis = {}
+# Heartbeat condicional: dentro de la ventana de 300s servimos la copia de
+# sesión directamente — ni siquiera se paga el hash-check + deserialización
+# de cache_data en cada tick del slider.
+if "_rt_data" not in st.session_state or time.time() - st.session_state.get("_rt_last", 0) > 300:
+    st.session_state["_rt_data"] = get_realtime_sync()
+    st.session_state["_rt_last"] = time.time()
+realtime_data = st.session_state["_rt_data"]
+transporte = obtener_transporte()
+analisis = RouteAnalysis()
 
 if st.session_state["rutas_calculadas"]:
     analisis = obtener_analisis_tactico(
-        st.session_state["prisa"], 
-        st.session_state["c_orig"], 
+        st.session_state["prisa"],
+        st.session_state["c_orig"],
         st.session_state["c_dest"],
         st.session_state["incidentes"],
-        realtime_data
+        realtime_data,
+        incidentes_epoch=st.session_state.get("_inc_epoch", 0),
+        realtime_epoch=realtime_data.get("metrics", {}).get("last_sync", ""),
     )
 
 # --- 7. MAIN INTERFACE (SIDE BAR + DASHBOARD) ---
@@ -334,21 +596,12 @@ if st.session_state["rutas_calculadas"]:
 col_side, col_main = st.columns([0.25, 0.75], gap="small")
 
 with col_side:
-    st.markdown('''
-    <div class="header-container">
-        <h1 class="brand-title"><b>U</b>RBANgraph</h1>
-        <div class="brand-subtitle">Plataforma de Análisis Topológico | Ingeniería Mexicana</div>
-    </div>
-    
-    <div style="font-size: 0.65rem; color: #94A3B8; margin-top: -5px; line-height: 1.3; margin-bottom: 20px; font-weight: 500;">
-        Motor de Inteligencia Espacial optimizado para la gestión de riesgos y movilidad urbana.
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(_SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
 
     # UI Reactiva Misión 9
     stress_class = "stress-low"
-    if analisis and "integridad" in analisis:
-        level = analisis["integridad"].get("urban_stress_level", "LOW")
+    if analisis.integridad:
+        level = analisis.integridad.get("urban_stress_level", "LOW")
         if level == "MODERATE": stress_class = "stress-moderate"
         elif level in ["CRITICAL", "SHADOW_ZONE"]: stress_class = "stress-critical"
     
@@ -356,7 +609,7 @@ with col_side:
     st.markdown(f'<script>window.parent.document.querySelector(\'[data-testid="stSidebar"]\').className += " {stress_class}";</script>', unsafe_allow_html=True)
 
     # Obtenemos los datos con seguridad, si no existen ponemos 0 o 'NORMAL'
-    datos_integridad = (analisis or {}).get("integridad", {})
+    datos_integridad = analisis.integridad or {}
     stress_val = datos_integridad.get("urban_stress_percentage", 0)
     stress_lvl = datos_integridad.get("urban_stress_level", "NORMAL")
     
@@ -369,13 +622,11 @@ with col_side:
     st.markdown(f'<div style="text-align:center; font-weight:700; font-size:0.7rem; color:{"#10B981" if stress_class=="stress-low" else "#EF4444"};">{status_msg}</div>', unsafe_allow_html=True)
 
     
-    opciones = list(COORDENADAS_FIJAS.keys()) + ["-- Manual --"]
-    
     col_orig, col_dest = st.columns(2)
     with col_orig:
-        sel_o = st.selectbox("Punto de Origen", opciones, index=0)
+        sel_o = st.selectbox("Punto de Origen", FIXED_NAMES, index=0)
     with col_dest:
-        sel_d = st.selectbox("Punto de Destino", opciones, index=1)
+        sel_d = st.selectbox("Punto de Destino", FIXED_NAMES, index=1)
         
     dir_o = st.text_input("Ingresar Origen", "") if sel_o == "-- Manual --" else sel_o
     dir_d = st.text_input("Ingresar Destino", "") if sel_d == "-- Manual --" else sel_d
@@ -387,45 +638,40 @@ with col_side:
     if st.button("ANALIZAR RUTA PERSONALIZADA", type="primary", use_container_width=True):
         with st.spinner("Sincronizando con UrbanOS..."):
             try:
-                # Geocoding con Fallback Maestro (WTC CDMX / Parque Hundido)
-                try:
-                    c_o = COORDENADAS_FIJAS[dir_o]["coords"] if dir_o in COORDENADAS_FIJAS else engine.geocode_with_cache(f"{dir_o}, CDMX")
-                    c_d = COORDENADAS_FIJAS[dir_d]["coords"] if dir_d in COORDENADAS_FIJAS else engine.geocode_with_cache(f"{dir_d}, CDMX")
-                except:
-                    c_o, c_d = (19.3948, -99.1736), (19.378, -99.178)
+                # Geocoding con Fallback Maestro: origen y destino se
+                # resuelven en paralelo (Nominatim es I/O puro y los dos
+                # lookups son independientes entre sí).
+                with ThreadPoolExecutor(max_workers=2) as ex:
+                    f_o = None if dir_o in COORDENADAS_FIJAS else ex.submit(engine.geocode_with_cache, f"{dir_o}, CDMX")
+                    f_d = None if dir_d in COORDENADAS_FIJAS else ex.submit(engine.geocode_with_cache, f"{dir_d}, CDMX")
+                    c_o = COORDENADAS_FIJAS[dir_o]["coords"] if f_o is None else f_o.result()
+                    c_d = COORDENADAS_FIJAS[dir_d]["coords"] if f_d is None else f_d.result()
+
+                # geocode_with_cache nunca lanza (fallback interno a WTC):
+                # un chequeo por None reemplaza el try/except ancho y salta
+                # al landmark fijo más cercano a la última posición conocida.
+                if not c_o or not c_d:
                     st.toast("⚠️ Coordenadas de respaldo activadas")
+                    c_o = c_o or landmark_mas_cercano(st.session_state.get("c_orig", (19.3948, -99.1736)))
+                    c_d = c_d or landmark_mas_cercano(st.session_state.get("c_dest", (19.378, -99.178)))
 
                 G = obtener_grafo_optimizado()
                 st.session_state["incidentes"] = engine.generar_incidentes_sinteticos(G)
+                # Epoch de incidentes: escalar que representa a la lista en
+                # la clave del caché del análisis (ver obtener_analisis_tactico)
+                st.session_state["_inc_epoch"] = time.time()
                 st.session_state.update({"c_orig": c_o, "c_dest": c_d, "rutas_calculadas": True})
                 st.rerun()
             except Exception as e:
                 st.error(f"Falla en el motor: {str(e)}") # Muestra el error real para debugging
 
     st.markdown('<br>', unsafe_allow_html=True)
-    st.markdown('''
-    <div class="legend-sidebar" style="margin-top: 0px; border-top: none;">
-        <div class="legend-item"><i class="fa fa-exclamation-triangle legend-icon" style="color:#EF4444"></i> Riesgo C5 (Fatal)</div>
-        <div class="legend-item"><div class="legend-icon" style="color:#10B981">●</div> Ruta Escudo (Segura)</div>
-        <div class="legend-item"><div class="legend-icon" style="color:#EF4444">●</div> Ruta Relámpago (Veloz)</div>
-        <div class="legend-item"><div class="legend-icon" style="color:orange">●</div> Estación Metro</div>
-        <div class="legend-item"><i class="fa fa-bicycle legend-icon" style="color:#F59E0B"></i> Red Ecobici</div>
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(_LEGEND_HTML, unsafe_allow_html=True)
+
+    st.markdown(_QUOTE_HTML, unsafe_allow_html=True)
 
-    st.markdown('''
-        <div class="quote-box">
-            Soli Deo Gloria. Ingeniería al servicio del prójimo. Que el sistema sea limpio y funcional.
-        </div>
-    ''', unsafe_allow_html=True)
-    
     # Persistent Fixed Footer
-    st.markdown(f'''
-    <div class="status-footer-fixed">
-        <div><span class="status-dot"></span> API ONLINE 2.6.0</div>
-        <div>UrbanGraph Tactical</div>
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(_FOOTER_FIXED_HTML, unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -435,73 +681,64 @@ with col_main:
 
 with col_main:
     # 1. Top Metrics Bar - Pure Sans (No Emojis)
-    t_relajado = int(analisis.get("directa_time", 0))
-    m_ganados = int(analisis.get("directa_time", 0) - analisis.get("relampago_time", 0)) if analisis.get("relampago") else 0
-    distancia = int(analisis.get("relampago_dist", 0) or analisis.get("directa_dist", 0))
+    t_relajado = int(analisis.directa_time)
+    m_ganados = int(analisis.directa_time - analisis.relampago_time) if analisis.relampago else 0
+    distancia = int(analisis.relampago_dist or analisis.directa_dist)
     
-    st.markdown(f'''
-    <div class="metrics-bar">
-        <div class="metric-card">
-            <div class="metric-label">Tiempo Relajado</div>
-            <div class="metric-value blue">{t_relajado} min</div>
-        </div>
-        <div class="metric-card">
-            <div class="metric-label">Minutos Ganados</div>
-            <div class="metric-value green">+{m_ganados}</div>
-        </div>
-        <div class="metric-card">
-            <div class="metric-label">Distancia Total</div>
-            <div class="metric-value">{distancia}m</div>
-        </div>
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(_METRICS_TMPL.format(t_relajado=t_relajado, m_ganados=m_ganados, distancia=distancia), unsafe_allow_html=True)
     
     # 2. Map Area (Fixed Height 700px)
     if not st.session_state["rutas_calculadas"]:
         st.markdown('<div class="map-container" style="display:flex; align-items:center; justify-content:center; background:#FFFFFF; height: 700px; border-radius: 8px; border: 1px solid #F8FAFC;"><h2 style="color:#E2E8F0; font-weight:200;">Parámetros de misión requeridos</h2></div>', unsafe_allow_html=True)
     else:
+        # Placeholder estable: el widget del mapa se reconcilia en el mismo
+        # slot entre reruns en vez de montarse como un elemento nuevo.
+        map_slot = st.empty()
         try:
-            G = obtener_grafo_optimizado()
-            m = folium.Map(tiles='CartoDB Positron', attr='UrbanGraph', zoom_start=14)
-            
-            # Draw Paths
-            if analisis.get("directa"):
-                folium.PolyLine([(G.nodes[n]['y'], G.nodes[n]['x']) for n in analisis["directa"]], color='#475569', weight=3, opacity=0.2).add_to(m)
-            if analisis.get("escudo"):
-                folium.PolyLine([(G.nodes[n]['y'], G.nodes[n]['x']) for n in analisis["escudo"]], color='#10B981', weight=5, opacity=0.5).add_to(m)
-            if analisis.get("relampago"):
-                folium.PolyLine([(G.nodes[n]['y'], G.nodes[n]['x']) for n in analisis["relampago"]], color='#EF4444', weight=6, opacity=0.8).add_to(m)
-
-            # Markers (FontAwesome Professionals)
+            # Import diferido: tras el primer render es un hit a sys.modules
+            from streamlit_folium import st_folium
+
             incidents_to_render = st.session_state["incidentes"] + realtime_data.get("incidents", [])
-            for inc in incidents_to_render:
-                folium.Marker([inc["lat"], inc["lon"]], 
-                              icon=folium.Icon(color=inc["color"], icon='exclamation-triangle', prefix='fa'), 
-                              tooltip=inc['tipo']).add_to(m)
-            
-            for stn in transporte:
-                folium.CircleMarker([stn['lat'], stn['lon']], radius=2, color=stn['color'], fill=True).add_to(m)
-
-            folium.Marker(st.session_state["c_orig"], icon=folium.Icon(color='green', icon='play', prefix='fa'), tooltip="Origen").add_to(m)
-            folium.Marker(st.session_state["c_dest"], icon=folium.Icon(color='red', icon='flag-checkered', prefix='fa'), tooltip="Destino").add_to(m)
-
-            m.fit_bounds([st.session_state["c_orig"], st.session_state["c_dest"]], padding=(30, 30))
-            st_folium(m, width=None, height=700, returned_objects=[])
+
+            # LOD espacial: la latencia de st_folium crece lineal con el
+            # número de objetos; colapsamos a un representante por celda de
+            # ~10m (un solo np.unique vs. miles de marcadores duplicados).
+            if len(incidents_to_render) > 1:
+                celdas = (np.array(
+                    [(i["lat"], i["lon"]) for i in incidents_to_render],
+                    dtype=np.float32,
+                ) * 10000).astype(np.int32)
+                _, keep = np.unique(celdas, axis=0, return_index=True)
+                incidents_to_render = [incidents_to_render[int(k)] for k in np.sort(keep)]
+
+            # Firma barata del contenido del mapa: si no cambió, reutilizamos
+            # el folium.Map ya construido en la sesión (los reruns por
+            # interacción no pagan la reconstrucción de marcadores).
+            map_fp = (
+                st.session_state["c_orig"], st.session_state["c_dest"],
+                len(incidents_to_render), len(transporte),
+                analisis.directa_dist, analisis.escudo_dist,
+                analisis.relampago_dist,
+            )
+            if st.session_state.get("_map_fp") != map_fp or "_map_obj" not in st.session_state:
+                st.session_state["_map_obj"] = construir_mapa_tactico(
+                    analisis, incidents_to_render, transporte,
+                    st.session_state["c_orig"], st.session_state["c_dest"]
+                )
+                st.session_state["_map_fp"] = map_fp
+
+            with map_slot:
+                st_folium(st.session_state["_map_obj"], width=None, height=700, returned_objects=[])
         except Exception as e:
             st.error(f"Render Error: {e}")
 
     # 3. Status Footer
-    st.markdown(f'''
+    st.markdown('''
     <div class="status-footer" style="display:none;">
     ''', unsafe_allow_html=True)
 
     # 4. Status Footer
-    st.markdown(f'''
-    <div class="status-footer">
-        <div><span class="status-dot"></span> API ONLINE 2.6.0</div>
-        <div>UrbanGraph Tactical</div>
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
 
     st.markdown('</div>', unsafe_allow_html=True)
 
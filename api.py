@@ -1,22 +1,32 @@
 from fastapi import FastAPI, Header, HTTPException, Depends, Security
+from fastapi.responses import ORJSONResponse
 from fastapi.security.api_key import APIKeyHeader
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Tuple
 import engine
+import hmac
 import logging
+import threading
 import time
 
 # --- Configuration & Security ---
 API_KEY = "SANDOVAL-ENGINE-PRO-2040"
+# Precomputado en import: el check por request solo encodea la llave recibida
+_API_KEY_BYTES = API_KEY.encode()
 api_key_header = APIKeyHeader(name="access_token", auto_error=True)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("UrbanAPI")
 
+# Reloj monotónico: inmune a ajustes NTP/DST, resta entera por probe
+START_TS = time.monotonic()
+
 app = FastAPI(
     title="URBANgraph Enterprise",
     description="Intelligence-Driven Logistics & Integrity Engine. Soli Deo Gloria.",
-    version="1.1.0"
+    version="1.1.0",
+    # orjson serializa las listas de nodos de ruta en C (~3-10x vs json)
+    default_response_class=ORJSONResponse
 )
 
 # --- Global State: Safe Graph Loading ---
@@ -52,11 +62,47 @@ class HealthStatus(BaseModel):
     status: str
     engine: str
     integrity_check: str
+    uptime: str
     timestamp: str
 
+# --- Idempotencia Acotada ---
+# Las flotas reenvían la misma misión en ráfagas (ver stress_test.py, que ya
+# manda X-Idempotency-Key). El caché es acotado y con TTL desde el día uno:
+# un dict sin límite en un server de larga vida es una fuga de memoria.
+_IDEM_MAX = 10_000
+_IDEM_TTL = 3600.0  # segundos
+_idem_cache: Dict[str, Tuple[float, dict]] = {}
+_idem_lock = threading.Lock()  # los endpoints corren en el threadpool
+
+def _idem_get(key: str):
+    with _idem_lock:
+        hit = _idem_cache.get(key)
+        if hit and time.time() - hit[0] < _IDEM_TTL:
+            return hit[1]
+        if hit:
+            del _idem_cache[key]
+    return None
+
+def _idem_put(key: str, response: dict):
+    with _idem_lock:
+        if len(_idem_cache) >= _IDEM_MAX:
+            _idem_cache.pop(next(iter(_idem_cache)))  # FIFO: el más viejo
+        _idem_cache[key] = (time.time(), response)
+
+# --- Caché TTL de Analytics ---
+# Los dashboards BI sondean /analytics/score con las mismas coordenadas en
+# loop; cada hit sin caché repite el fetch HTTP a ADIP. Clave redondeada a
+# 4 decimales (~11 m): misma cuadra => mismo score durante 60 s.
+_SCORE_MAX = 4096
+_SCORE_TTL = 60.0  # segundos
+_score_cache: Dict[Tuple[float, float], Tuple[float, dict]] = {}
+_score_lock = threading.Lock()
+
 # --- Security Dependency ---
 async def get_api_key(api_key: str = Security(api_key_header)):
-    if api_key != API_KEY:
+    # compare_digest es de tiempo constante: un != de strings corta en el
+    # primer byte distinto y filtra por timing cuánto prefijo acertó el cliente
+    if not hmac.compare_digest(api_key.encode(), _API_KEY_BYTES):
         raise HTTPException(status_code=403, detail="Invalid access_token")
     return api_key
 
@@ -69,15 +115,25 @@ async def health_check():
         "status": "Operational",
         "engine": "Sandoval-v2.5",
         "integrity_check": "Soli Deo Gloria. Integrity Verified.",
+        "uptime": f"{int(time.monotonic() - START_TS)}s",
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
     }
 
+# Los endpoints de análisis son CPU-bound: se declaran síncronos para que
+# FastAPI los despache a su threadpool en vez de bloquear el event loop de
+# Uvicorn (el Dijkstra de SciPy libera el GIL, así que los workers escalan).
 @app.post("/api/v1/analyze", response_model=RouteResponse)
-async def analyze_route(request: AnalyzeRequest, _=Depends(get_api_key)):
+def analyze_route(request: AnalyzeRequest, _=Depends(get_api_key),
+                  x_idempotency_key: Optional[str] = Header(None, alias="X-Idempotency-Key")):
     """Accepts origin/dest, returns 3 enterprise routes + integrity score."""
     if G_BASE is None:
         raise HTTPException(status_code=500, detail="Graph Engine Offline")
-    
+
+    if x_idempotency_key:
+        cached = _idem_get(x_idempotency_key)
+        if cached is not None:
+            return cached
+
     try:
         # Geocoding via Engine Cache
         coords_orig = engine.geocode_with_cache(request.origin)
@@ -95,17 +151,29 @@ async def analyze_route(request: AnalyzeRequest, _=Depends(get_api_key)):
             realtime_data=realtime
         )
         
+        if x_idempotency_key:
+            _idem_put(x_idempotency_key, analysis)
         return analysis
     except Exception as e:
         logger.error(f"Analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/v1/analytics/score")
-async def get_confidence_score(lat: float, lon: float, _=Depends(get_api_key)):
+def get_confidence_score(lat: float, lon: float, _=Depends(get_api_key)):
     """Returns a 'Confidence Index' based on ADIP cameras and infrastructure density."""
+    clave = (round(lat, 4), round(lon, 4))
+    with _score_lock:
+        hit = _score_cache.get(clave)
+        if hit and time.time() - hit[0] < _SCORE_TTL:
+            return hit[1]
+
     try:
         infra = engine.fetch_adip_infrastructure(lat, lon)
         score = engine.calculate_analytics_score([], G_BASE, infra)
+        with _score_lock:
+            if len(_score_cache) >= _SCORE_MAX:
+                _score_cache.pop(next(iter(_score_cache)))  # FIFO: el más viejo
+            _score_cache[clave] = (time.time(), score)
         return score
     except Exception as e:
         logger.error(f"Score calculation failed: {e}")
@@ -137,7 +205,7 @@ class IntegrityResponse(BaseModel):
 
 
 @app.post("/api/v1/integrity_check", response_model=IntegrityResponse)
-async def integrity_check(request: IntegrityRequest, _=Depends(get_api_key)):
+def integrity_check(request: IntegrityRequest, _=Depends(get_api_key)):
     """Evalúa el riesgo total de una ruta y sugiere alternativas."""
     if G_BASE is None:
         raise HTTPException(status_code=500, detail="Graph Engine Offline")
@@ -152,5 +220,22 @@ async def integrity_check(request: IntegrityRequest, _=Depends(get_api_key)):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # Multi-worker: el análisis de rutas es CPU-bound, un solo proceso deja
+    # el resto de los cores ociosos. WEB_CONCURRENCY permite fijarlo en
+    # despliegue; el default 2*cores+1 es la regla clásica para mezclas
+    # de CPU e I/O. uvloop/httptools aceleran loop y parser HTTP si están
+    # instalados; uvicorn cae a asyncio/h11 si no.
+    workers = int(os.getenv("WEB_CONCURRENCY", 2 * multiprocessing.cpu_count() + 1))
+    try:
+        import uvloop  # noqa: F401
+        loop_impl = "uvloop"
+    except ImportError:
+        loop_impl = "auto"
+
+    # Con workers > 1 uvicorn necesita el import string, no el objeto app.
+    uvicorn.run("api:app", host="0.0.0.0", port=8000,
+                workers=workers, loop=loop_impl, http="auto")
@@ -1,8 +1,13 @@
 import requests
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
 import json
+import signal
+import threading
+
+try:
+    import orjson  # serialización en C, ~5-10x sobre json estándar
+except ImportError:
+    orjson = None
 import time
 import os
 import logging
@@ -31,11 +36,16 @@ BACKUP_STATIC_FILE = "backup_data.json"
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# Sesión compartida: reutiliza la conexión TLS con ADIP/Telegram entre ciclos
+# en lugar de pagar handshake completo en cada requests.get suelto. Mismo
+# patrón que HTTP_SESSION en engine.py.
+HTTP_SESSION = requests.Session()
+
 
 def fetch_adip_data():
     """Descarga datos de la API de Datos Abiertos de la CDMX."""
     try:
-        response = requests.get(ADIP_URL, timeout=10)
+        response = HTTP_SESSION.get(ADIP_URL, timeout=10)
         response.raise_for_status()
         data = response.json()
         if data.get("success"):
@@ -63,31 +73,48 @@ def send_telegram_alert(incident_data):
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": msg, "parse_mode": "Markdown"}
     
     try:
-        requests.post(url, json=payload, timeout=5)
+        HTTP_SESSION.post(url, json=payload, timeout=5)
         logger.info("Alerta de Telegram enviada con éxito.")
     except Exception as e:
         logger.error(f"Error enviando alerta de Telegram: {e}")
 
+# Debounce de alertas: la API de ADIP devuelve los mismos incidentes durante
+# varios ciclos de 15 min; sin memoria, cada ciclo re-alertaba el mismo evento.
+_alerted_keys = set()
+_ALERTED_MAX = 10_000
+
+def _incident_key(inc):
+    """Identidad estable de un incidente: tipo + cuadra (~11 m)."""
+    return (inc.get("tipo"), round(inc.get("lat", 0.0), 4), round(inc.get("lon", 0.0), 4))
+
 def check_active_routes_collision(incidents):
     """
     Misión 8: Cruza nuevos incidentes contra rutas activas.
     Para esta demo, simulamos la detección de colisión si el incidente
     cae dentro de zonas de alto tráfico.
     """
+    if len(_alerted_keys) > _ALERTED_MAX:
+        _alerted_keys.clear()
+
     for inc in incidents:
-        # Lógica Sandoval: Si el incidente es de alto impacto, alertamos
+        # Lógica Sandoval: Si el incidente es de alto impacto y no fue
+        # alertado en ciclos previos, alertamos (una vez por ciclo).
         if inc.get("impacto", 0) >= 5.0:
+            key = _incident_key(inc)
+            if key in _alerted_keys:
+                continue
+            _alerted_keys.add(key)
             send_telegram_alert(inc)
             break # Evitamos spam para la demo
 
 
 def process_data(records):
-    """Limpia y procesa los datos usando Pandas y GeoPandas."""
+    """Limpia y procesa los datos usando Pandas (acceso por columnas, sin iterrows)."""
     if not records:
         return None
-    
+
     df = pd.DataFrame(records)
-    
+
     # Limpieza básica
     # Se asume que las columnas son 'latitud' y 'longitud' basándose en la API de CDMX
     try:
@@ -98,27 +125,64 @@ def process_data(records):
         logger.error(f"Columnas de coordenadas no encontradas: {e}")
         return None
 
-    # Convertir a GeoDataFrame
-    geometry = [Point(xy) for xy in zip(df['longitud'], df['latitud'])]
-    gdf = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
-    
+    # Solo consumimos lat/lon como floats: no hace falta materializar un
+    # GeoDataFrame ni un Point de shapely por fila. Extraemos las columnas a
+    # arrays de NumPy de un golpe y armamos los dicts con un zip plano.
+    lats = df['latitud'].to_numpy(dtype=float)
+    lons = df['longitud'].to_numpy(dtype=float)
+    if 'incidente_c4' in df.columns:
+        tipos = df['incidente_c4'].fillna("Incidente Vial").tolist()
+    else:
+        tipos = ["Incidente Vial"] * len(df)
+
     # Estructura para UrbanGraph
-    incidents = []
-    for _, row in gdf.iterrows():
-        incidents.append({
-            "tipo": row.get("incidente_c4", "Incidente Vial"),
-            "lat": row["latitud"],
-            "lon": row["longitud"],
+    incidents = [
+        {
+            "tipo": tipo,
+            "lat": lat,
+            "lon": lon,
             "impacto": 5.0, # Impacto Sandoval 2.5
             "color": "red",
             "icon": "exclamation-triangle"
-        })
-    
+        }
+        for tipo, lat, lon in zip(tipos, lats.tolist(), lons.tolist())
+    ]
+
     return incidents
 
+def _escribir_fallback(data):
+    """Escritura atómica del fallback: tmp + os.replace.
+
+    La API lee FALLBACK_FILE en caliente; escribir directo sobre él deja
+    un JSON truncado visible si el ingestor muere a media escritura.
+    """
+    if orjson is not None:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        raw = json.dumps(data, indent=2).encode()
+    tmp = FALLBACK_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, FALLBACK_FILE)
+
+
+INTERVALO_INGESTA = 15 * 60  # segundos
+
+# Evento de paro: time.sleep(900) ignoraba SIGTERM durante 15 minutos;
+# Event.wait despierta al instante cuando llega la señal.
+_stop_event = threading.Event()
+
+def _solicitar_paro(signum, frame):
+    logger.info("Señal de paro recibida. Cerrando ingestor limpiamente...")
+    _stop_event.set()
+
+
 def run_ingestor():
     """Ciclo principal de ingesta cada 15 minutos."""
-    while True:
+    # Deadline sobre reloj monotónico: el ciclo no deriva aunque la
+    # ingesta misma tarde (el siguiente tick descuenta lo ya consumido).
+    proximo_tick = time.monotonic()
+    while not _stop_event.is_set():
         logger.info("Iniciando ciclo de ingesta de datos ADIP...")
         records = fetch_adip_data()
         
@@ -134,8 +198,7 @@ def run_ingestor():
                 "last_sync": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "status": "Healthy"
             }
-            with open(FALLBACK_FILE, "w") as f:
-                json.dump(output, f, indent=4)
+            _escribir_fallback(output)
             logger.info(f"Datos sincronizados. {len(incidents)} incidentes guardados en {FALLBACK_FILE}.")
         else:
             logger.warning("Fallo en ingesta. Manteniendo datos previos o usando backup estático.")
@@ -144,13 +207,19 @@ def run_ingestor():
                     logger.info("Cargando backup estático para inicializar fallback.")
                     with open(BACKUP_STATIC_FILE, "r") as f:
                         static_data = json.load(f)
-                        with open(FALLBACK_FILE, "w") as f2:
-                            json.dump(static_data, f2, indent=4)
+                    _escribir_fallback(static_data)
                 else:
                     logger.error("No se encontró backup_data.json para fallback inicial.")
 
         logger.info("Esperando 15 minutos para el siguiente ciclo...")
-        time.sleep(15 * 60)
+        proximo_tick += INTERVALO_INGESTA
+        espera = max(0.0, proximo_tick - time.monotonic())
+        if _stop_event.wait(timeout=espera):
+            break
+
+    logger.info("Ingestor detenido.")
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _solicitar_paro)
+    signal.signal(signal.SIGINT, _solicitar_paro)
     run_ingestor()
@@ -11,14 +11,33 @@ import random
 import time
 import json
 import os
+import hashlib
+import inspect
+import functools
 try:
     import streamlit as st
 except ImportError:
     st = None
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import numpy as np
 from scipy.spatial import KDTree
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra as csr_dijkstra
 from typing import Dict, List, Optional, Tuple
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+try:
+    import orjson  # parser SIMD: ~3-10x sobre json stdlib en payloads GBFS/C5
+except ImportError:
+    orjson = None
+
+def _json_loads(raw: bytes):
+    """Parsea JSON con orjson si está disponible (fallback a stdlib)."""
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 # --- UrbanOS 2040: Configuración de Logs ---
 logging.basicConfig(
@@ -96,6 +115,53 @@ if st:
 if not DATABASE_URL:
     DATABASE_URL = os.getenv("DATABASE_URL")
 
+def _formula_version() -> str:
+    """Hash del código fuente de la Fórmula Sandoval.
+
+    Permite invalidar los grafos cacheados en disco automáticamente
+    cuando el algoritmo de pesos cambia entre versiones.
+    """
+    fuente = inspect.getsource(aplicar_formula_sandoval)
+    return hashlib.md5(fuente.encode()).hexdigest()[:8]
+
+def _graph_cache_path(lugar: str, network_type: str = "walk") -> str:
+    """Ruta del caché de disco para un grafo ya procesado."""
+    clave = f"{lugar}|{network_type}|{_formula_version()}"
+    slug = hashlib.md5(clave.encode()).hexdigest()[:12]
+    return os.path.join(ox.settings.cache_folder, f"grafo_{slug}.graphml")
+
+def get_graph(lugar: str, network_type: str = "walk"):
+    """Obtiene el grafo de un lugar con caché persistente en disco.
+
+    Estrategia CTO (Cold Start 60x): la descarga de OSM + parseo toma ~1 min;
+    un `.graphml` local keyed por (lugar, network_type, versión de fórmula)
+    convierte cada arranque frío en una sola lectura de disco.
+
+    Args:
+        lugar (str): Nombre del lugar para OSMnx (e.g. alcaldía/colonia).
+        network_type (str): Tipo de red vial ('walk', 'drive', etc.).
+
+    Returns:
+        nx.MultiDiGraph: El grafo urbano, desde caché si existe.
+    """
+    cache_path = _graph_cache_path(lugar, network_type)
+    if os.path.exists(cache_path):
+        try:
+            logger.info(f"Graph Cache HIT: {cache_path}")
+            return ox.load_graphml(cache_path)
+        except Exception as e:
+            logger.error(f"Graph Cache corrupto ({cache_path}): {e}. Re-descargando.")
+
+    logger.info(f"Graph Cache MISS: descargando {lugar} de OpenStreetMap...")
+    G = ox.graph_from_place(lugar, network_type=network_type)
+    try:
+        os.makedirs(ox.settings.cache_folder, exist_ok=True)
+        ox.save_graphml(G, cache_path)
+    except Exception:
+        # Entornos de solo lectura (e.g. contenedores restrictivos)
+        pass
+    return G
+
 def cargar_grafo_seguro():
     """
     Descarga y prepara el grafo base. 
@@ -118,10 +184,10 @@ def cargar_grafo_seguro():
         except Exception as e:
             logger.error(f"Error cargando {archivo_mapa}: {e}")
 
-    # Último recurso: Descarga Directa de OSM (Benito Juárez)
+    # Último recurso: Descarga Directa de OSM (Benito Juárez) vía caché de disco
     logger.info("Último Recurso: Descargando grafo directamente de OpenStreetMap.")
     try:
-        G = ox.graph_from_place(RISK_PROFILE["LOCATION"], network_type="walk")
+        G = get_graph(RISK_PROFILE["LOCATION"], network_type="walk")
         # No intentamos guardar si estamos en un entorno restrictivo, pero Streamlit Cloud suele permitirlo en el CWD
         try:
             ox.save_graphml(G, archivo_mapa)
@@ -156,36 +222,40 @@ def evaluar_integridad_ruta(ruta_coords: List[Tuple[float, float]], cargo_value_
     stress_points = 0
     detected_threats = []
     total_segments = len(ruta_coords) - 1
-    
+
     # Detalle de factores
     factors = {"incidents": 0, "risk_zones": 0, "infrastructure": 0}
-    
+
     if total_segments <= 0: return {"integrity_score": 0, "status": "Invalid Route"}
 
-    for i in range(total_segments):
-        p1 = ruta_coords[i]
-        p2 = ruta_coords[i+1]
-        mid_x = (p1[1] + p2[1]) / 2
-        mid_y = (p1[0] + p2[0]) / 2
-        
-        # 1. Chequeo de Incidentes (C5/ADIP)
-        if tree_incidents:
-            dist, idx = tree_incidents.query([mid_x, mid_y])
-            if dist < 0.0045: # 500m
-                stress_points += 1
-                factors["incidents"] += 1
-                threat = all_incidents[idx]
-                detected_threats.append({
-                    "type": threat.get("tipo", "C5_INCIDENT_REPORT"),
-                    "location": [threat["lat"], threat["lon"]],
-                    "description": f"Reporte activo en radio de 500m. Riesgo {cargo_value_tier}."
-                })
-        
-        # 2. Chequeo de Zonas de Riesgo Histórico (Mock logic for demonstration)
-        # En una versión real, esto consultaría una tabla de 'hotspots' en PostGIS
-        if 19.41 < mid_y < 19.42 and -99.16 < mid_x < -99.15:
-            factors["risk_zones"] += 0.5
-            stress_points += 0.5
+    # Puntos medios de todos los segmentos de un golpe (columna 0 = lat,
+    # columna 1 = lon): antes el loop hacía una query de KDTree por segmento
+    # con el overhead de despacho de SciPy por llamada; batched, el árbol
+    # resuelve los N puntos en una sola pasada en C.
+    pts = np.asarray(ruta_coords, dtype=np.float64)
+    mids = (pts[:-1] + pts[1:]) * 0.5
+
+    # 1. Chequeo de Incidentes (C5/ADIP)
+    if tree_incidents:
+        dists, idxs = tree_incidents.query(mids[:, ::-1])  # árbol indexa (lon, lat)
+        hits = np.flatnonzero(dists < 0.0045) # 500m
+        stress_points += int(hits.size)
+        factors["incidents"] = int(hits.size)
+        for i in hits.tolist():
+            threat = all_incidents[int(idxs[i])]
+            detected_threats.append({
+                "type": threat.get("tipo", "C5_INCIDENT_REPORT"),
+                "location": [threat["lat"], threat["lon"]],
+                "description": f"Reporte activo en radio de 500m. Riesgo {cargo_value_tier}."
+            })
+
+    # 2. Chequeo de Zonas de Riesgo Histórico (Mock logic for demonstration)
+    # En una versión real, esto consultaría una tabla de 'hotspots' en PostGIS
+    zona = ((19.41 < mids[:, 0]) & (mids[:, 0] < 19.42)
+            & (-99.16 < mids[:, 1]) & (mids[:, 1] < -99.15))
+    riesgo = 0.5 * float(zona.sum())
+    factors["risk_zones"] += riesgo
+    stress_points += riesgo
 
     stress_percentage = (stress_points / total_segments) * 100 * sensitivity
     stress_percentage = min(100.0, stress_percentage)
@@ -237,6 +307,10 @@ def evaluar_integridad_ruta(ruta_coords: List[Tuple[float, float]], cargo_value_
 FETCH_TIMEOUT = 3.0  # Segundos (Senior Backend Standard)
 BACKUP_FILE = "backup_data.json"
 
+# Sesión persistente: reutiliza TCP+TLS entre syncs en vez de re-negociar
+# el handshake con cada requests.get.
+HTTP_SESSION = requests.Session()
+
 def fetch_realtime_data() -> Dict:
     """Orquesta la ingesta de datos con patrón Circuit Breaker y Respaldo Local.
 
@@ -265,32 +339,33 @@ def fetch_realtime_data() -> Dict:
     total_sources = 2
     start_time = time.time()
 
-    try:
-        # 1. Ecobici Availability (Timeout de 3s)
+    def _fetch_ecobici() -> int:
+        """1. Ecobici Availability (Timeout de 3s)."""
         url_eco = "https://gbfs.mex.lyftbikes.com/gbfs/es/station_status.json"
         try:
-            res = requests.get(url_eco, timeout=FETCH_TIMEOUT)
+            res = HTTP_SESSION.get(url_eco, timeout=FETCH_TIMEOUT)
             if res.status_code == 200:
-                stations = res.json()["data"]["stations"]
+                stations = _json_loads(res.content)["data"]["stations"]
                 data["ecobici"] = {s["station_id"]: s["num_bikes_available"] for s in stations}
                 valid_reports = sum(1 for s in stations if s.get("last_reported", 0) > 0)
                 data["metrics"]["fidelity"] = int((valid_reports / len(stations) * 100)) if stations else 100
-                success_count += 1
                 logger.info("Sync Audit: Ecobici data consumed successfully.")
-            else:
-                logger.error(f"Sync Audit: Ecobici API status {res.status_code}")
+                return 1
+            logger.error(f"Sync Audit: Ecobici API status {res.status_code}")
         except requests.Timeout:
             logger.warning("Sync Audit: Ecobici API Timeout (3s). Circuit Breaker engaged.")
         except Exception as e:
             logger.error(f"Sync Audit: Ecobici Error: {e}")
+        return 0
 
-        # 2. CDMX Real-time Incidents (Timeout de 3s)
+    def _fetch_c5() -> int:
+        """2. CDMX Real-time Incidents (Timeout de 3s)."""
         resource_id = "59d5ede6-7af8-4384-a114-f84ff1b26fe1"
         url_c5 = f"https://datos.cdmx.gob.mx/api/3/action/datastore_search?resource_id={resource_id}&limit=50&q=BENITO+JUAREZ"
         try:
-            res = requests.get(url_c5, timeout=FETCH_TIMEOUT)
+            res = HTTP_SESSION.get(url_c5, timeout=FETCH_TIMEOUT)
             if res.status_code == 200:
-                records = res.json()["result"]["records"]
+                records = _json_loads(res.content)["result"]["records"]
                 for rec in records:
                     try:
                         lat = float(rec.get("latitud", 0))
@@ -307,14 +382,20 @@ def fetch_realtime_data() -> Dict:
                             })
                     except (ValueError, TypeError):
                         logger.warning(f"Sync Audit: Map skipping record with invalid coords: {rec.get('latitud')}, {rec.get('longitud')}")
-                success_count += 1
                 logger.info("Sync Audit: C5 Incidents ingested successfully.")
-            else:
-                logger.error(f"Sync Audit: C5 API status {res.status_code}")
+                return 1
+            logger.error(f"Sync Audit: C5 API status {res.status_code}")
         except requests.Timeout:
             logger.warning("Sync Audit: C5 API Timeout (3s). Circuit Breaker engaged.")
         except Exception as e:
             logger.error(f"Sync Audit: C5 Error: {e}")
+        return 0
+
+    try:
+        # Fuentes independientes en paralelo: la latencia del sync es
+        # max(ecobici, c5) en lugar de la suma de ambas.
+        with ThreadPoolExecutor(max_workers=total_sources) as ex:
+            success_count = sum(f.result() for f in [ex.submit(_fetch_ecobici), ex.submit(_fetch_c5)])
 
         # --- Análisis de Telemetría ---
         data["metrics"]["latency_ms"] = int((time.time() - start_time) * 1000)
@@ -332,8 +413,8 @@ def fetch_realtime_data() -> Dict:
         logger.critical(f"Sync Audit: Global Failure: {e}. Orchestrating data fallback.")
         data["integrity"] = "Critical (Resiliencia Activa)"
         if os.path.exists(BACKUP_FILE):
-            with open(BACKUP_FILE, "r") as f:
-                backup = json.load(f)
+            with open(BACKUP_FILE, "rb") as f:
+                backup = _json_loads(f.read())
                 data.update({
                     "ecobici": backup.get("ecobici", {}),
                     "incidents": backup.get("incidents", []),
@@ -366,19 +447,23 @@ def generar_incidentes_sinteticos(G) -> List[Dict]:
         {"tipo": "Falla de Luminaria", "impacto": 1.5, "icon": "lightbulb", "color": "yellow"},
         {"tipo": "Obra en Vía", "impacto": 3.0, "icon": "hard-hat", "color": "brown"}
     ]
-    nodos = list(G.nodes)
-    num_incidentes = random.randint(3, 8)
+    # Muestreo vectorizado sobre el SoA: antes cada llamada materializaba
+    # list(G.nodes) completo (decenas de miles de IDs) y hacía un lookup de
+    # dict por incidente; ahora son dos draws de RNG y un gather de coords.
+    soa = obtener_soa(G)
+    rng = np.random.default_rng()
+    num_incidentes = int(rng.integers(3, 9))
+    idx = rng.integers(0, len(soa.idx_to_id), size=num_incidentes)
+    tipos = rng.integers(0, len(incident_types), size=num_incidentes)
+    latlon = soa.coords.take(idx, axis=0)
+
     incidentes = []
-    
-    for _ in range(num_incidentes):
-        node_id = random.choice(nodos)
-        tipo = random.choice(incident_types)
-        node_data = G.nodes[node_id]
+    for i, t, (lat, lon) in zip(idx, tipos, latlon.tolist()):
         incidentes.append({
-            "node": node_id,
-            "lat": node_data['y'],
-            "lon": node_data['x'],
-            **tipo
+            "node": soa.idx_to_id[int(i)],
+            "lat": lat,
+            "lon": lon,
+            **incident_types[int(t)]
         })
     return incidentes
 
@@ -401,6 +486,198 @@ def build_graph_spatial_index(G) -> Tuple[KDTree, List]:
         coords.append((data['x'], data['y']))
     return KDTree(coords), nodes
 
+_SPATIAL_INDEX_CACHE: Dict[int, Tuple[KDTree, List]] = {}
+
+def nodo_mas_cercano(G, lat: float, lon: float):
+    """Mapea un punto geográfico a su nodo más cercano en O(log N).
+
+    ox.nearest_nodes reconstruye su índice bajo demanda; aquí el KDTree de
+    build_graph_spatial_index se construye una vez por grafo y se reutiliza,
+    de modo que cada snap es una sola consulta en C.
+    """
+    key = id(G)
+    entry = _SPATIAL_INDEX_CACHE.get(key)
+    if entry is None or len(entry[1]) != G.number_of_nodes():
+        entry = build_graph_spatial_index(G)
+        _SPATIAL_INDEX_CACHE[key] = entry
+    tree, nodes = entry
+    _, idx = tree.query([lon, lat])
+    return nodes[int(idx)]
+
+# --- UrbanOS 2040: Reductor JIT de rutas (Misión Turbo) ---
+if njit:
+    @njit(cache=True)
+    def _suma_ruta_csr(path_idx, indptr, indices, length):
+        """Suma 'length' de una ruta en un solo pase compilado a máquina.
+
+        Por cada salto (u, v) escanea la fila CSR de u (grado urbano ~4,
+        el escaneo lineal gana al binary search) tomando la arista
+        paralela más corta.
+        """
+        total = 0.0
+        for k in range(path_idx.size - 1):
+            j = path_idx[k + 1]
+            best = np.inf
+            for e in range(indptr[path_idx[k]], indptr[path_idx[k] + 1]):
+                if indices[e] == j and length[e] < best:
+                    best = length[e]
+            if best < np.inf:
+                total += best
+        return total
+else:
+    _suma_ruta_csr = None
+
+@dataclass
+class GraphSoA:
+    """Representación Struct-of-Arrays del grafo urbano.
+
+    El MultiDiGraph de NetworkX guarda todo en dicts anidados: cada acceso a
+    un atributo de arista es un triple hash lookup y cada extracción de
+    coordenadas paga ese impuesto por salto. Aquí las coordenadas y las
+    aristas viven en arreglos contiguos (layout CSR), de modo que extraer
+    la polilínea de una ruta o recorrer pesos es un gather de NumPy.
+    """
+    coords: np.ndarray  # (N, 2) float32: columna 0 = lat, columna 1 = lon
+    indptr: np.ndarray
+    indices: np.ndarray
+    length: np.ndarray
+    cost: np.ndarray
+    id_to_idx: Dict
+    idx_to_id: List
+
+    def coords_de_ruta(self, ruta: List) -> np.ndarray:
+        """Extrae las coordenadas (lat, lon) de una ruta en un solo gather."""
+        path_idx = np.fromiter(
+            (self.id_to_idx[n] for n in ruta), dtype=np.int64, count=len(ruta)
+        )
+        return self.coords.take(path_idx, axis=0)
+
+    def longitud_de_ruta(self, ruta: List) -> float:
+        """Suma 'length' de una ruta leyendo los arreglos CSR directamente.
+
+        Sustituye el camino route_to_gdf (construcción de un GeoDataFrame
+        completo solo para sumar una columna) por búsquedas sobre memoria
+        contigua; con aristas paralelas toma la más corta.
+        """
+        if not ruta or len(ruta) < 2:
+            return 0.0
+        path_idx = np.fromiter(
+            (self.id_to_idx[n] for n in ruta), dtype=np.int64, count=len(ruta)
+        )
+        if _suma_ruta_csr is not None:
+            return float(_suma_ruta_csr(path_idx, self.indptr, self.indices, self.length))
+        # Fallback NumPy cuando Numba no está instalado
+        total = 0.0
+        for k in range(path_idx.size - 1):
+            lo, hi = self.indptr[path_idx[k]], self.indptr[path_idx[k] + 1]
+            hit = self.length[lo:hi][self.indices[lo:hi] == path_idx[k + 1]]
+            if hit.size:
+                total += float(hit.min())
+        return total
+
+_SOA_CACHE: Dict[int, GraphSoA] = {}
+
+# Caché compartido entre workers: con uvicorn multi-proceso cada worker
+# reconstruía el SoA con el mismo loop Python sobre 159k aristas. Los
+# arreglos son invariantes del grafo base (cost por-request se calcula
+# aparte en _pesos_sandoval_arrays), así que se publican una vez como
+# .npy en /dev/shm y los demás workers los mapean read-only: las páginas
+# físicas se comparten, N workers pagan 1x memoria por los arreglos.
+_SOA_SHM_DIR = "/dev/shm/urbangraph_soa"
+_SOA_SHM_CAMPOS = ("coords", "indptr", "indices", "length", "cost", "node_ids")
+
+def _guardar_soa_shm(soa: GraphSoA):
+    """Publica los arreglos del SoA en /dev/shm (best-effort, atómico por archivo)."""
+    try:
+        os.makedirs(_SOA_SHM_DIR, exist_ok=True)
+        arreglos = {
+            "coords": soa.coords, "indptr": soa.indptr, "indices": soa.indices,
+            "length": soa.length, "cost": soa.cost,
+            "node_ids": np.asarray(soa.idx_to_id, dtype=np.int64),
+        }
+        for nombre in _SOA_SHM_CAMPOS:
+            destino = os.path.join(_SOA_SHM_DIR, f"{nombre}.npy")
+            tmp = destino + f".tmp{os.getpid()}"
+            np.save(tmp, arreglos[nombre])
+            os.replace(tmp, destino)
+    except OSError as e:
+        logger.debug(f"SoA compartido no publicado: {e}")
+
+def _cargar_soa_shm(G) -> Optional[GraphSoA]:
+    """Mapea el SoA desde /dev/shm si corresponde exactamente a este grafo."""
+    try:
+        rutas = {c: os.path.join(_SOA_SHM_DIR, f"{c}.npy") for c in _SOA_SHM_CAMPOS}
+        if not all(os.path.exists(p) for p in rutas.values()):
+            return None
+        node_ids = np.load(rutas["node_ids"], mmap_mode="r")
+        propios = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+        if node_ids.size != propios.size or not np.array_equal(node_ids, propios):
+            return None
+        indices = np.load(rutas["indices"], mmap_mode="r")
+        if indices.size != G.number_of_edges():
+            return None
+        idx_to_id = propios.tolist()
+        return GraphSoA(
+            np.load(rutas["coords"], mmap_mode="r"),
+            np.load(rutas["indptr"], mmap_mode="r"),
+            indices,
+            np.load(rutas["length"], mmap_mode="r"),
+            np.load(rutas["cost"], mmap_mode="r"),
+            {n: i for i, n in enumerate(idx_to_id)},
+            idx_to_id,
+        )
+    except (OSError, ValueError) as e:
+        logger.debug(f"SoA compartido ilegible, se reconstruye: {e}")
+        return None
+
+def graph_to_soa(G, weight: str = 'final_impedance') -> GraphSoA:
+    """Convierte el MultiDiGraph a GraphSoA (una sola pasada sobre el grafo)."""
+    node_ids = list(G.nodes)
+    id_to_idx = {n: i for i, n in enumerate(node_ids)}
+    n = len(node_ids)
+
+    # float32 contiguo: precisión de ~1cm a escala urbana, la mitad de ancho
+    # de banda que float64 y cero floats boxeados por lookup de nodo.
+    coords = np.empty((n, 2), dtype=np.float32)
+    node_attrs = G._node  # dict interno: sin dispatch de NodeView
+    for i, nid in enumerate(node_ids):
+        d = node_attrs[nid]
+        coords[i, 0] = d['y']
+        coords[i, 1] = d['x']
+
+    deg = np.zeros(n + 1, dtype=np.int64)
+    for u in G.nodes:
+        deg[id_to_idx[u] + 1] = G.out_degree(u)
+    indptr = np.cumsum(deg)
+
+    m = int(indptr[-1])
+    indices = np.empty(m, dtype=np.int64)
+    # float32: suficiente para metros urbanos y la mitad de huella de memoria
+    length = np.empty(m, dtype=np.float32)
+    cost = np.empty(m, dtype=np.float32)
+    cursor = indptr[:-1].copy()
+    for u, v, data in G.edges(data=True):
+        i = id_to_idx[u]
+        pos = cursor[i]
+        cursor[i] += 1
+        indices[pos] = id_to_idx[v]
+        length[pos] = float(data.get('length', 0.0))
+        cost[pos] = float(data.get(weight, data.get('length', 1.0)))
+
+    return GraphSoA(coords, indptr, indices, length, cost, id_to_idx, node_ids)
+
+def obtener_soa(G) -> GraphSoA:
+    """Accessor con caché por identidad de grafo (evita reconstrucciones)."""
+    key = id(G)
+    soa = _SOA_CACHE.get(key)
+    if soa is None or soa.indices.size != G.number_of_edges():
+        soa = _cargar_soa_shm(G)
+        if soa is None:
+            soa = graph_to_soa(G)
+            _guardar_soa_shm(soa)
+        _SOA_CACHE[key] = soa
+    return soa
+
 def aplicar_formula_sandoval(G, weather_impact=1.0, hurry_factor=50.0, incidentes: List[Dict] = None, realtime_data: Dict = None, nivel_volatilidad: float = 1.0):
     """Aplica la Función de Costo Generalizado Sandoval 2.5 (Enterprise).
     
@@ -427,6 +704,7 @@ def aplicar_formula_sandoval(G, weather_impact=1.0, hurry_factor=50.0, incidente
     
     tree_incidents = KDTree(incident_pts) if incident_pts else None
 
+    node_attrs = G._node  # lookup directo por nodo en el loop caliente
     for u, v, k, data in G.edges(keys=True, data=True):
         segment_length = data.get('length', 10.0)
         street_name = str(data.get('name', '')).lower()
@@ -448,8 +726,8 @@ def aplicar_formula_sandoval(G, weather_impact=1.0, hurry_factor=50.0, incidente
         # Sandoval Formula Mission 2: +500% (6.0x multiplier)
         volatilidad_penalty = 1.0
         if tree_incidents:
-            mid_x = (G.nodes[u]['x'] + G.nodes[v]['x']) / 2
-            mid_y = (G.nodes[u]['y'] + G.nodes[v]['y']) / 2
+            mid_x = (node_attrs[u]['x'] + node_attrs[v]['x']) / 2
+            mid_y = (node_attrs[u]['y'] + node_attrs[v]['y']) / 2
             indices = tree_incidents.query_ball_point([mid_x, mid_y], 0.0045)
             if indices:
                 volatilidad_penalty = 5.0 * nivel_volatilidad
@@ -461,17 +739,237 @@ def aplicar_formula_sandoval(G, weather_impact=1.0, hurry_factor=50.0, incidente
     return G
 
 
+def construir_csr(G, weight: str = 'final_impedance'):
+    """Convierte el MultiDiGraph a una matriz dispersa CSR para SciPy.
+
+    Optimización Hot Path: el Dijkstra de NetworkX paga ~1µs por relajación
+    (heap en Python + dict-de-dicts); el de SciPy corre en C sobre arreglos
+    contiguos. Entre aristas paralelas conservamos la de menor peso.
+
+    Returns:
+        Tuple: (matriz CSR, dict nodo->índice, lista índice->nodo).
+    """
+    node_ids = list(G.nodes)
+    idx = {n: i for i, n in enumerate(node_ids)}
+
+    mejores = {}
+    for u, v, data in G.edges(data=True):
+        w = float(data.get(weight, data.get('length', 1.0)))
+        key = (idx[u], idx[v])
+        if key not in mejores or w < mejores[key]:
+            mejores[key] = w
+
+    row = np.fromiter((k[0] for k in mejores), dtype=np.int64, count=len(mejores))
+    col = np.fromiter((k[1] for k in mejores), dtype=np.int64, count=len(mejores))
+    # float32: el loop interno de Dijkstra es bandwidth-bound sobre
+    # indices+data; la mitad de ancho por peso = mitad de tráfico de caché.
+    # A escala urbana (<1 km por arista) la precisión de 32 bits sobra.
+    vals = np.fromiter(mejores.values(), dtype=np.float64, count=len(mejores)).astype(np.float32)
+    n = len(node_ids)
+    return csr_matrix((vals, (row, col)), shape=(n, n)), idx, node_ids
+
+def ruta_dijkstra_csr(G, n_orig, n_dest, weight: str = 'final_impedance') -> List:
+    """Ruta punto a punto con el Dijkstra en C de scipy.sparse.csgraph."""
+    csr, idx, node_ids = construir_csr(G, weight)
+    dist, pred = csr_dijkstra(csr, indices=idx[n_orig], return_predecessors=True)
+    j = idx[n_dest]
+    if np.isinf(dist[j]):
+        raise nx.NetworkXNoPath(f"No hay conectividad entre {n_orig} y {n_dest}")
+    path = []
+    while j >= 0:
+        path.append(node_ids[j])
+        j = pred[j]
+    return path[::-1]
+
+def longitud_de_ruta(G, ruta: List) -> float:
+    """Suma la longitud real (metros) de una ruta ya calculada en O(|ruta|).
+
+    Evita correr un segundo Dijkstra solo para conocer la distancia: con el
+    camino en mano, la métrica alterna se acumula arista por arista
+    (tomando la paralela más corta cuando existen duplicadas).
+    """
+    if not ruta or len(ruta) < 2:
+        return 0.0
+    total = 0.0
+    adj = G._adj  # acceso directo: evita el dispatch de __getitem__ por salto
+    for u, v in zip(ruta[:-1], ruta[1:]):
+        total += min(float(d.get('length', 0.0)) for d in adj[u][v].values())
+    return total
+
 def calcular_ruta_optima(G, coords_orig, coords_dest, criteria='final_impedance'):
     """Calcula la trayectoria óptima entre dos puntos geográficos."""
     try:
-        n_orig = ox.nearest_nodes(G, coords_orig[1], coords_orig[0])
-        n_dest = ox.nearest_nodes(G, coords_dest[1], coords_dest[0])
-        ruta = nx.shortest_path(G, n_orig, n_dest, weight=criteria)
+        n_orig = nodo_mas_cercano(G, coords_orig[0], coords_orig[1])
+        n_dest = nodo_mas_cercano(G, coords_dest[0], coords_dest[1])
+        try:
+            ruta = ruta_dijkstra_csr(G, n_orig, n_dest, weight=criteria)
+        except nx.NetworkXNoPath:
+            raise
+        except Exception as e:
+            # Fallback de estabilidad: Dijkstra puro de NetworkX
+            logger.warning(f"CSR Dijkstra fallback engaged: {e}")
+            ruta = nx.shortest_path(G, n_orig, n_dest, weight=criteria)
         return ruta, n_orig, n_dest
     except Exception as e:
         logger.error(f"Route calculation failed: {e}")
         return None, None, None
 
+def _pesos_sandoval_arrays(G, weather_impact=1.0, incidentes: List[Dict] = None, realtime_data: Dict = None, nivel_volatilidad: float = 1.0):
+    """Una sola pasada sobre las aristas -> arreglos (row, col, length, safety).
+
+    Calcula el peso de seguridad Sandoval por arista SIN el blend de prisa:
+    con estos arreglos, cualquier hurry_factor es una expresión NumPy en vez
+    de otra pasada completa sobre el grafo. El penalty de volatilidad sale de
+    una sola consulta batched al KDTree de incidentes.
+    """
+    node_ids = list(G.nodes)
+    idx = {n: i for i, n in enumerate(node_ids)}
+
+    all_incidents = list(incidentes or [])
+    if realtime_data and "incidents" in realtime_data:
+        all_incidents.extend(realtime_data["incidents"])
+    incident_pts = [[inc["lon"], inc["lat"]] for inc in all_incidents if "lat" in inc and "lon" in inc]
+    tree_incidents = KDTree(incident_pts) if incident_pts else None
+
+    m = G.number_of_edges()
+    row = np.empty(m, dtype=np.int64)
+    col = np.empty(m, dtype=np.int64)
+    length = np.empty(m, dtype=np.float64)
+    safety = np.empty(m, dtype=np.float64)
+    mid_x = np.empty(m, dtype=np.float64)
+    mid_y = np.empty(m, dtype=np.float64)
+
+    node_attrs = G._node
+    safe_keys = RISK_PROFILE["KEYWORDS"]["SAFE"]
+    danger_keys = RISK_PROFILE["KEYWORDS"]["DANGER"]
+
+    for pos, (u, v, data) in enumerate(G.edges(data=True)):
+        street_name = str(data.get('name', '')).lower()
+        highway = str(data.get('highway', '')).lower()
+
+        risk_multiplier = RISK_PROFILE["WEIGHTS"]["STANDARD"]
+        if any(safe_key in street_name for safe_key in safe_keys):
+            risk_multiplier = RISK_PROFILE["WEIGHTS"]["SAFE"]
+        if any(danger_key in street_name for danger_key in danger_keys):
+            risk_multiplier = RISK_PROFILE["WEIGHTS"]["DANGER"]
+
+        is_primary = any(av in street_name for av in ['insurgentes', 'eje central', 'universidad', 'cuauhtemoc', 'division del norte'])
+        is_fast = any(h in highway for h in ['primary', 'secondary', 'tertiary'])
+        infra_bonus = 0.6 if (is_primary or is_fast) else 1.0
+
+        row[pos] = idx[u]
+        col[pos] = idx[v]
+        length[pos] = float(data.get('length', 10.0))
+        safety[pos] = risk_multiplier * infra_bonus * weather_impact
+        u_d, v_d = node_attrs[u], node_attrs[v]
+        mid_x[pos] = (u_d['x'] + v_d['x']) / 2
+        mid_y[pos] = (u_d['y'] + v_d['y']) / 2
+
+    if tree_incidents is not None and m > 0:
+        counts = tree_incidents.query_ball_point(np.column_stack([mid_x, mid_y]), 0.0045, return_length=True)
+        safety *= np.where(counts > 0, 5.0 * nivel_volatilidad, 1.0)
+
+    return row, col, length, safety, idx, node_ids
+
+def _firma_incidentes(incidentes: List[Dict] = None, realtime_data: Dict = None) -> Tuple:
+    """Firma hashable del conjunto de incidentes para claves de caché."""
+    all_incidents = list(incidentes or [])
+    if realtime_data and "incidents" in realtime_data:
+        all_incidents.extend(realtime_data["incidents"])
+    return tuple(sorted(
+        (round(inc["lat"], 5), round(inc["lon"], 5))
+        for inc in all_incidents if "lat" in inc and "lon" in inc
+    ))
+
+# Preprocesar-una-vez, consultar-rápido: el grafo es estático entre consultas;
+# solo cambian O-D y el perfil de pesos. Cacheamos los arreglos de pesos y el
+# patrón de dispersión por (grafo, clima, volatilidad, incidentes).
+_PESOS_CACHE: Dict[Tuple, Tuple] = {}
+_PESOS_CACHE_MAX = 8
+
+def _rutas_multi_criterio(G, n_orig, n_dest, hurry_factor=50.0, weather_impact=1.0, incidentes: List[Dict] = None, realtime_data: Dict = None, nivel_volatilidad: float = 1.0) -> Dict[str, Tuple[Optional[List], float]]:
+    """Directa/Escudo/Relámpago con una sola lectura del grafo.
+
+    Las tres búsquedas comparten la misma pasada de aristas y el mismo patrón
+    de dispersión CSR; solo cambia el arreglo de pesos que se entrega al
+    Dijkstra en C de SciPy. Devuelve por criterio (ruta, costo total).
+    """
+    clave = (
+        id(G), G.number_of_edges(), round(weather_impact, 3),
+        round(nivel_volatilidad, 3), _firma_incidentes(incidentes, realtime_data)
+    )
+    precomputo = _PESOS_CACHE.get(clave)
+    if precomputo is None:
+        row, col, length, safety, idx, node_ids = _pesos_sandoval_arrays(
+            G, weather_impact=weather_impact, incidentes=incidentes,
+            realtime_data=realtime_data, nivel_volatilidad=nivel_volatilidad
+        )
+        # Deduplicar aristas paralelas: mínimo por (u, v) para cada criterio
+        order = np.lexsort((col, row))
+        r_s, c_s = row[order], col[order]
+        grupo_nuevo = np.empty(order.size, dtype=bool)
+        if order.size:
+            grupo_nuevo[0] = True
+            grupo_nuevo[1:] = (r_s[1:] != r_s[:-1]) | (c_s[1:] != c_s[:-1])
+        starts = np.flatnonzero(grupo_nuevo)
+        ur, uc = r_s[starts], c_s[starts]
+        if len(_PESOS_CACHE) >= _PESOS_CACHE_MAX:
+            _PESOS_CACHE.pop(next(iter(_PESOS_CACHE)))
+        precomputo = (length, safety, idx, node_ids, order, starts, ur, uc)
+        _PESOS_CACHE[clave] = precomputo
+    length, safety, idx, node_ids, order, starts, ur, uc = precomputo
+
+    h_ratio = hurry_factor / 100.0
+    s_ratio = 1.0 - h_ratio
+    pesos = {
+        "directa": length,
+        "escudo": length * safety,  # Hurry=0: impedancia de seguridad pura
+        "relampago": length * (safety * s_ratio + h_ratio),
+    }
+    n = len(node_ids)
+
+    i_orig, i_dest = idx[n_orig], idx[n_dest]
+
+    # Búsqueda acotada: sin límite, Dijkstra expande el grafo completo aunque
+    # O-D estén a cinco cuadras. Se acota el frente al costo de un rodeo de 4x
+    # la línea recta, escalado por el peor multiplicador peso/longitud de cada
+    # criterio para no descartar rutas óptimas caras. Si el destino queda
+    # fuera del presupuesto (par mal conectado), se reintenta sin límite.
+    o_d, d_d = G._node[n_orig], G._node[n_dest]
+    dlat = np.radians(d_d['y'] - o_d['y'])
+    dlon = np.radians(d_d['x'] - o_d['x'])
+    a = (np.sin(dlat / 2) ** 2
+         + np.cos(np.radians(o_d['y'])) * np.cos(np.radians(d_d['y'])) * np.sin(dlon / 2) ** 2)
+    hav_m = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+    presupuesto_base = max(3000.0, 4.0 * float(hav_m))
+
+    def _resolver(w) -> Tuple[Optional[List], float]:
+        vals = np.minimum.reduceat(w[order], starts) if order.size else w
+        # float32 reduce a la mitad el ancho del arreglo de pesos (ver construir_csr)
+        csr = csr_matrix((vals.astype(np.float32), (ur, uc)), shape=(n, n))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio_max = float(np.nanmax(np.where(length > 0, w / length, 1.0))) if length.size else 1.0
+        limite = presupuesto_base * max(1.0, ratio_max)
+        dist, pred = csr_dijkstra(csr, indices=i_orig, return_predecessors=True, limit=limite)
+        if np.isinf(dist[i_dest]):
+            # Fallback de corrección: el presupuesto geométrico se quedó corto
+            dist, pred = csr_dijkstra(csr, indices=i_orig, return_predecessors=True)
+        if np.isinf(dist[i_dest]):
+            return None, float('inf')
+        path = []
+        j = i_dest
+        while j >= 0:
+            path.append(node_ids[j])
+            j = pred[j]
+        return path[::-1], float(dist[i_dest])
+
+    # Los tres criterios son independientes y el Dijkstra de SciPy suelta el
+    # GIL, así que tres hilos se acercan a 3x en el paso dominante de latencia.
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futuros = {nombre: ex.submit(_resolver, w) for nombre, w in pesos.items()}
+        resultados = {nombre: f.result() for nombre, f in futuros.items()}
+    return resultados
+
 def obtener_analisis_multi_ruta(G, coords_orig, coords_dest, hurry_factor=50.0, weather_impact=1.0, incidentes: List[Dict] = None, realtime_data: Dict = None, nivel_volatilidad: float = None):
     """Trayectorias Enterprise: Escudo (Hurry=0), Relámpago (Hurry=User), Directa (Length)."""
     if nivel_volatilidad is None:
@@ -481,18 +979,35 @@ def obtener_analisis_multi_ruta(G, coords_orig, coords_dest, hurry_factor=50.0,
     q_dest = get_quadrant_id(coords_dest[0], coords_dest[1])
     logger.info(f"MISSION INITIATED: From {q_orig} to {q_dest} [Enterprise Mode]")
 
-    # 1. Ruta Directa (Pure Distance)
-    r_directa, n_orig, n_dest = calcular_ruta_optima(G, coords_orig, coords_dest, criteria='length')
-    
-    # 2. Ruta Escudo (Safety First - Hurry=0)
-    G_escudo = aplicar_formula_sandoval(G.copy(), weather_impact=weather_impact, hurry_factor=0, incidentes=incidentes, realtime_data=realtime_data, nivel_volatilidad=nivel_volatilidad)
-    r_escudo, _, _ = calcular_ruta_optima(G_escudo, coords_orig, coords_dest)
-    
-    # 3. Ruta Relámpago (Balanced - User Input)
-    G_relampago = aplicar_formula_sandoval(G.copy(), weather_impact=weather_impact, hurry_factor=hurry_factor, incidentes=incidentes, realtime_data=realtime_data, nivel_volatilidad=nivel_volatilidad)
-    r_relampago, _, _ = calcular_ruta_optima(G_relampago, coords_orig, coords_dest)
+    # Las tres trayectorias (Directa/Escudo/Relámpago) salen de una sola
+    # pasada de aristas + tres Dijkstra CSR que comparten estructura, en vez
+    # de dos G.copy() + dos re-ponderaciones completas del grafo.
+    r_directa = r_escudo = r_relampago = None
+    n_orig = n_dest = None
+    imp_relampago = float('inf')
+    try:
+        n_orig = nodo_mas_cercano(G, coords_orig[0], coords_orig[1])
+        n_dest = nodo_mas_cercano(G, coords_dest[0], coords_dest[1])
+        rutas = _rutas_multi_criterio(
+            G, n_orig, n_dest, hurry_factor=hurry_factor,
+            weather_impact=weather_impact, incidentes=incidentes,
+            realtime_data=realtime_data, nivel_volatilidad=nivel_volatilidad
+        )
+        r_directa, _ = rutas["directa"]
+        r_escudo, _ = rutas["escudo"]
+        r_relampago, imp_relampago = rutas["relampago"]
+    except Exception as e:
+        logger.error(f"Route calculation failed: {e}")
+
+    # Fusión de pasadas: las distancias salen aquí mismo sobre el SoA, así
+    # la capa Streamlit no re-camina cada ruta para volver a sumarlas.
+    soa = obtener_soa(G)
+    distancias = {
+        f"{nombre}_dist": (soa.longitud_de_ruta(r) if r and len(r) > 1 else 0.0)
+        for nombre, r in (("directa", r_directa), ("escudo", r_escudo), ("relampago", r_relampago))
+    }
+
 
-    
     # Calculate Integrity Score based on incidents evaded
     # (Simple version: if direct has hits and others have none, score is higher)
     hits_directa = sum(1 for n in (r_directa or []) if n in (realtime_data.get("incidents", []) if realtime_data else []))
@@ -518,8 +1033,8 @@ def obtener_analisis_multi_ruta(G, coords_orig, coords_dest, hurry_factor=50.0,
     try:
         avg_multiplier = 0
         if r_relampago:
-            total_l = sum(G.edges[u, v, k]['length'] for u, v, k in zip(r_relampago[:-1], r_relampago[1:], [0]*len(r_relampago)))
-            total_i = sum(G_relampago.edges[u, v, k]['final_impedance'] for u, v, k in zip(r_relampago[:-1], r_relampago[1:], [0]*len(r_relampago)))
+            total_l = distancias["relampago_dist"]
+            total_i = imp_relampago  # costo total ya devuelto por el Dijkstra
             avg_multiplier = total_i / total_l if total_l > 0 else 1.0
         
         if avg_multiplier > 15.0:
@@ -553,6 +1068,7 @@ def obtener_analisis_multi_ruta(G, coords_orig, coords_dest, hurry_factor=50.0,
         "escudo": r_escudo,
         "relampago": r_relampago,
         "directa": r_directa,
+        **distancias,
         "nodes": (n_orig, n_dest),
         "integrity_score": round(integrity_score, 2),
         "eluded_incidents": eluded,
@@ -692,10 +1208,21 @@ def calculate_analytics_score(route_nodes: List, G: nx.MultiDiGraph, infra: Dict
     }
 
 def geocode_with_cache(query: str):
-    """Capa de optimización de costos (CTO Optimization)."""
+    """Capa de optimización de costos (CTO Optimization).
+
+    El LRU de sesión convierte clics repetidos en un lookup de
+    microsegundos y memoiza también el fallback, evitando reintentar
+    Nominatim con consultas que ya fallaron. El JSON en disco persiste
+    los aciertos entre procesos. La clave se canonicaliza (strip+lower):
+    "Metro Zapata, CDMX" y "metro zapata, cdmx" son la misma consulta.
+    """
+    return _geocode_canonico(query.strip().lower())
+
+@functools.lru_cache(maxsize=4096)
+def _geocode_canonico(query: str):
     if query in GEO_CACHE:
         return tuple(GEO_CACHE[query])
-    
+
     try:
         coords = ox.geocode(query)
         GEO_CACHE[query] = coords
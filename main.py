@@ -2,6 +2,7 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from typing import List, Tuple
+import networkx as nx
 import engine
 
 import os
@@ -84,15 +85,14 @@ async def get_safe_route(request: RouteRequest, token: str = Depends(verify_toke
         )
         
         ruta, n_orig, n_dest = engine.calcular_ruta_optima(
-            G_local, 
-            request.origin, 
-            request.destination, 
-            criterio='final_impedance'
+            G_local,
+            request.origin,
+            request.destination,
+            criteria='final_impedance'
         )
-        
-        # Calcular distancia real de esta ruta
-        import networkx as nx
-        distancia = nx.shortest_path_length(G_local, n_orig, n_dest, weight='length')
+
+        # Calcular distancia real de esta ruta (suma O(|ruta|), sin segundo Dijkstra)
+        distancia = engine.longitud_de_ruta(G_local, ruta)
         
         # Placeholder para explicación de IA (LLM Integration)
         clima_msg = "lluvia intensa" if request.weather_factor > 1.0 else "cielo despejado"